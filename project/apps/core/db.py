@@ -0,0 +1,19 @@
+import time
+
+from django.db import OperationalError
+
+
+def retry_on_locked(func, attempts=5, delay=0.2):
+    """
+    Выполняет func и повторяет попытку, если SQLite ответил
+    "database is locked" (база занята другой записью).
+    func должна сама открывать транзакцию, чтобы каждая попытка
+    начиналась с чистого состояния
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except OperationalError as error:
+            if "database is locked" not in str(error) or attempt == attempts:
+                raise
+            time.sleep(delay * attempt)
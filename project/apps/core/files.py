@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+
+def write_file_atomic(path, write):
+    """
+    Записывает файл path так, что он появляется под своим именем
+    только целиком. write(file) пишет содержимое в открытый двоичный
+    файл; у каждого вызова свой временный файл в той же папке,
+    поэтому одновременные записи одного пути не портят друг друга
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False,
+    ) as file:
+        try:
+            write(file)
+        except BaseException:
+            file.close()
+            os.unlink(file.name)
+            raise
+    os.replace(file.name, path)
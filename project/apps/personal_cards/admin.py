@@ -9,3 +9,4 @@ admin.site.register(models.PersonalRecommendations)
 admin.site.register(models.PersonalStrength)
 admin.site.register(models.SoftSkill)
 admin.site.register(models.SoftSkillMark)
+admin.site.register(models.CardsRenderJob)
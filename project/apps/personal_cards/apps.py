@@ -5,3 +5,6 @@ class PersonalCardsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.personal_cards"
     verbose_name = "Личные отчеты"
+
+    def ready(self):
+        import apps.personal_cards.signals  # noqa: F401
@@ -0,0 +1,37 @@
+import zipfile
+
+
+class _StreamBuffer:
+    """
+    Неперематываемый файл для zipfile: записанные байты
+    накапливаются до тех пор, пока их не заберет генератор
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(entries):
+    """
+    Генератор zip-архива из entries - пар (имя файла, байты).
+    Каждый файл отдается сразу после записи, поэтому в памяти
+    находится не больше одного файла архива
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for filename, content in entries:
+            archive.writestr(filename, content)
+            yield buffer.pop()
+    # оглавление архива записывается при закрытии
+    yield buffer.pop()
@@ -0,0 +1,58 @@
+from pathlib import Path
+import re
+
+from django.conf import settings
+from fontTools.ttLib import TTFont
+from fontTools.varLib import instancer
+
+from apps.core.files import write_file_atomic
+
+FONTS_DIR = "personal_cards/fonts"
+# начертания, которые используются в styles.css
+STATIC_WEIGHTS = (400, 500, 700)
+
+VARIABLE_FONT_FACE = re.compile(r"@font-face\s*{[^}]*VariableFont[^}]*}")
+FONT_FAMILY = re.compile(r"font-family:\s*([^;]+);")
+FONT_URL = re.compile(r"url\(\s*[\"']?(.+?)[\"']?\s*\)")
+
+
+def get_static_instance(font_path, weight):
+    """
+    Возвращает путь к статическому начертанию weight вариативного
+    шрифта font_path. Начертание создается один раз и хранится в MEDIA_ROOT
+    """
+    font_path = Path(font_path)
+    path = Path(settings.MEDIA_ROOT) / FONTS_DIR / f"{font_path.stem}-{weight}.ttf"
+    if path.exists():
+        return path
+
+    font = TTFont(font_path)
+    # остальные оси (например, opsz) фиксируются на значениях по умолчанию
+    limits = {axis.axisTag: axis.defaultValue for axis in font["fvar"].axes}
+    limits["wght"] = weight
+    instancer.instantiateVariableFont(font, limits, inplace=True)
+
+    # несколько процессов пула могут создавать одно начертание одновременно
+    write_file_atomic(path, font.save)
+    return path
+
+
+def replace_variable_fonts(css_text, css_path):
+    """
+    Возвращает css_text, в котором правила @font-face с вариативными
+    шрифтами заменены на правила со статическими начертаниями STATIC_WEIGHTS
+    """
+    def replace(match):
+        rule = match.group(0)
+        family = FONT_FAMILY.search(rule).group(1)
+        url = FONT_URL.search(rule).group(1).replace("\\,", ",")
+        font_path = (Path(css_path).parent / url).resolve()
+
+        return "\n".join(
+            f"@font-face {{ font-family: {family}; "
+            f"src: url(\"{get_static_instance(font_path, weight).as_uri()}\"); "
+            f"font-weight: {weight}; }}"
+            for weight in STATIC_WEIGHTS
+        )
+
+    return VARIABLE_FONT_FACE.sub(replace, css_text)
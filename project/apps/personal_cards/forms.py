@@ -1,6 +1,7 @@
 from django import forms
 from django.core.exceptions import ValidationError
 
+from apps.core.models import Campus
 import apps.personal_cards.models as models
 
 
@@ -22,11 +23,98 @@ class CreateBatchForm(forms.Form):
             raise ValidationError("Начало периода должно быть раньше конца")
 
 
+class CreateBatchesForm(CreateBatchForm):
+    """
+    Создание папок карточек сразу для всех действующих классов
+    (или только классов одного кампуса)
+    """
+    campus = forms.ModelChoiceField(
+        label="Кампус",
+        queryset=Campus.objects.all(),
+        required=False,
+        empty_label="Все кампусы",
+    )
+
+
+class ArchiveBatchForm(forms.Form):
+    move_rows = forms.BooleanField(
+        label="Перенести рекомендации и успехи в архив",
+        help_text="Строки удаляются из рабочих таблиц и хранятся только в снимках карточек",
+        required=False,
+    )
+
+
+class BaseSparseInlineFormSet(forms.BaseInlineFormSet):
+    """
+    Формсет для строк, которые хранятся только после заполнения.
+    Для каждого значения keys (предмета или навыка), для которого
+    строки еще нет, создается пустая форма; она сохраняется,
+    только если ее заполнили. Формы перебираются в порядке keys.
+    Если строку пустой формы уже создало автосохранение ячейки
+    (SaveCardRowView), форма получает ее id и обновляет ее
+    """
+    key_field = None
+
+    def __init__(self, *args, keys=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.keys = list(keys)
+        existing = {
+            getattr(obj, f"{self.key_field}_id") for obj in self.get_queryset()
+        }
+        self.missing_keys = [key for key in self.keys if key.id not in existing]
+        self.extra = len(self.missing_keys)
+
+    def _construct_form(self, i, **kwargs):
+        extra_index = i - self.initial_form_count()
+        existing = self._get_saved_row(i) if extra_index >= 0 else None
+        if existing is not None:
+            kwargs["instance"] = existing
+        elif 0 <= extra_index < len(self.missing_keys):
+            kwargs["instance"] = self.model(
+                **{self.key_field: self.missing_keys[extra_index]}
+            )
+        return super()._construct_form(i, **kwargs)
+
+    def _get_saved_row(self, i):
+        """
+        Возвращает строку карточки, id которой прислан в пустой форме i
+        """
+        pk = self.data.get(f"{self.add_prefix(i)}-id") if self.is_bound else None
+        if not pk:
+            return None
+        try:
+            pk = self._get_to_python(self.model._meta.pk)(pk)
+        except ValidationError:
+            return None
+        return self._existing_object(pk)
+
+    def __iter__(self):
+        positions = {key.id: position for position, key in enumerate(self.keys)}
+        return iter(sorted(
+            self.forms,
+            key=lambda form: positions.get(
+                getattr(form.instance, f"{self.key_field}_id"), len(positions)
+            ),
+        ))
+
+
+class BaseSubjectsFormSet(BaseSparseInlineFormSet):
+    key_field = "subject"
+
+
+class BaseSoftskillsFormSet(BaseSparseInlineFormSet):
+    key_field = "skill"
+
+
 RecommendationsFormset = forms.inlineformset_factory(
     parent_model=models.PersonalCard,
     model=models.PersonalRecommendations,
-    fields=["text"],
-    widgets={"text": forms.Textarea(attrs={"rows": None})},
+    formset=BaseSubjectsFormSet,
+    fields=["subject", "text"],
+    widgets={
+        "subject": forms.HiddenInput(),
+        "text": forms.Textarea(attrs={"rows": None}),
+    },
     extra=0,
 )
 
@@ -34,14 +122,20 @@ RecommendationsFormset = forms.inlineformset_factory(
 StrengthsFormset = forms.inlineformset_factory(
     parent_model=models.PersonalCard,
     model=models.PersonalStrength,
-    fields=["text"],
-    widgets={"text": forms.Textarea(attrs={"rows": None})},
+    formset=BaseSubjectsFormSet,
+    fields=["subject", "text"],
+    widgets={
+        "subject": forms.HiddenInput(),
+        "text": forms.Textarea(attrs={"rows": None}),
+    },
     extra=0,
 )
 
 SofskillsFormset = forms.inlineformset_factory(
     parent_model=models.PersonalCard,
     model=models.SoftSkillMark,
-    fields=["mark"],
+    formset=BaseSoftskillsFormSet,
+    fields=["skill", "mark"],
+    widgets={"skill": forms.HiddenInput()},
     extra=0,
 )
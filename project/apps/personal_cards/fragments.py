@@ -0,0 +1,87 @@
+"""
+Версии данных, от которых зависят кэшируемые фрагменты карточки
+(card_parts/*.html). Версия входит в ключ фрагмента, поэтому при
+изменении данных достаточно сменить версию: старые фрагменты
+перестают использоваться и со временем вытесняются из кэша
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_fragments_cache():
+    return caches["template_fragments"]
+
+
+def solutions_key(student_id):
+    """Решения ученика"""
+    return f"personal_cards:solutions:{student_id}"
+
+
+def tests_key(group_id):
+    """Тесты, назначенные классу, и даты их написания"""
+    return f"personal_cards:tests:{group_id}"
+
+
+def softskills_key(student_id):
+    """Оценки межпредметных навыков ученика во всех его карточках"""
+    return f"personal_cards:softskills:{student_id}"
+
+
+def catalog_key():
+    """Справочники предметов и навыков - строки и столбцы всех карточек"""
+    return "personal_cards:catalog"
+
+
+def new_version():
+    return uuid.uuid4().hex
+
+
+def get_versions(keys):
+    """
+    Возвращает текущие версии keys. Если версии нет (еще не
+    создавалась или вытеснена из кэша), создается новая: так
+    фрагмент никогда не достанется по устаревшему ключу
+    """
+    cache = get_fragments_cache()
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return versions
+
+
+def bump_versions(keys):
+    get_fragments_cache().set_many(
+        {key: new_version() for key in keys}, timeout=None
+    )
+
+
+def get_cards_fragments(cards):
+    """
+    Возвращает для каждой карточки параметры кэширования ее фрагментов
+    (время хранения и версии данных) одним обращением к кэшу:
+    {id карточки: {"timeout": ..., "catalog": ..., "solutions": ..., ...}}
+    """
+    keys = {}
+    for card in cards:
+        keys[card.id] = {
+            "solutions": solutions_key(card.student_id),
+            "tests": tests_key(card.student.group_id),
+            "softskills": softskills_key(card.student_id),
+        }
+    versions = get_versions(list(
+        {key for card_keys in keys.values() for key in card_keys.values()}
+        | {catalog_key()}
+    ))
+    
+    return {
+        card_id: {
+            "timeout": settings.PERSONAL_CARDS_FRAGMENTS_TIMEOUT,
+            "catalog": versions[catalog_key()],
+            **{name: versions[key] for name, key in card_keys.items()},
+        }
+        for card_id, card_keys in keys.items()
+    }
@@ -0,0 +1,94 @@
+from pathlib import Path
+import shutil
+import zipfile
+
+from django.conf import settings
+
+from apps.core.db import retry_on_locked
+from apps.personal_cards.models import CardsRenderJob
+from apps.personal_cards.store import get_cards_pdfs
+from apps.personal_cards.services import get_batch_constructors
+
+
+JOBS_DIR = "personal_cards/jobs"
+
+
+def _cards_dir(job):
+    """
+    Каталог с уже сформированными pdf карточек задачи
+    """
+    return Path(settings.MEDIA_ROOT) / JOBS_DIR / str(job.id)
+
+
+def delete_job_files(job):
+    """
+    Удаляет архив задачи и pdf карточек, сформированных
+    незавершенной задачей
+    """
+    shutil.rmtree(_cards_dir(job), ignore_errors=True)
+    if job.archive:
+        job.archive.delete(save=False)
+
+
+def run_job(job):
+    """
+    Формирует pdf всех карточек папки и собирает из них архив.
+    Каждая карточка сохраняется в отдельный файл сразу после верстки,
+    поэтому прерванная задача продолжается с первой несформированной карточки
+    """
+    cards_dir = _cards_dir(job)
+    cards_dir.mkdir(parents=True, exist_ok=True)
+
+    constructors = get_batch_constructors(job.batch)
+    remaining = [
+        constructor for constructor in constructors
+        if not (cards_dir / f"{constructor.card.id}.pdf").exists()
+    ]
+    job.cards_total = len(constructors)
+    job.cards_done = len(constructors) - len(remaining)
+    job.save(update_fields=["cards_total", "cards_done", "updated_at"])
+
+    for constructor, pdf in zip(remaining, get_cards_pdfs(remaining)):
+        # файл появляется под своим именем только целиком
+        path = cards_dir / f"{constructor.card.id}.pdf"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(pdf)
+        tmp_path.replace(path)
+
+        job.cards_done += 1
+        retry_on_locked(
+            lambda: job.save(update_fields=["cards_done", "updated_at"])
+        )
+
+    archive_name = f"{JOBS_DIR}/{job.id}.zip"
+    with zipfile.ZipFile(
+        Path(settings.MEDIA_ROOT) / archive_name, "w", zipfile.ZIP_DEFLATED
+    ) as archive:
+        for constructor in constructors:
+            archive.write(
+                cards_dir / f"{constructor.card.id}.pdf",
+                constructor.get_filename(),
+            )
+    shutil.rmtree(cards_dir)
+
+    job.archive.name = archive_name
+    job.status = CardsRenderJob.DONE
+    job.save(update_fields=["archive", "status", "updated_at"])
+
+
+def run_next_job():
+    """
+    Выполняет одну задачу из очереди.
+    Возвращает выполненную задачу или None, если очередь пуста
+    """
+    job = retry_on_locked(CardsRenderJob.objects.claim_next)
+    if job is None:
+        return None
+
+    try:
+        run_job(job)
+    except Exception as error:
+        job.status = CardsRenderJob.FAILED
+        job.error = repr(error)
+        job.save(update_fields=["status", "error", "updated_at"])
+    return job
@@ -0,0 +1,299 @@
+from collections import defaultdict
+from functools import partial
+import datetime
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils.functional import SimpleLazyObject, cached_property
+
+from apps.core.models import Subject
+from apps.personal_cards import models
+from apps.personal_cards.fragments import get_cards_fragments
+from apps.personal_cards.snapshots import load_snapshot, thaw_context
+from apps.tests_app.models import TaskSolution, TestResultSummary
+from apps.tests_management.models import Task, TestAssign
+
+
+def get_studing_year_start(batch):
+    """
+    Возвращает 1 сентября учебного года, к которому относится папка
+    """
+    month = batch.start_date.month
+    year = batch.start_date.year
+    return datetime.date(year if month in (9, 10, 11, 12) else year - 1, 9, 1)
+
+
+def get_last_softskills_marks(students_ids, start_date, count=None):
+    """
+    Возвращает последние count оценок каждого межпредметного навыка
+    учеников students_ids из папок, начатых не позже start_date,
+    одним запросом (ROW_NUMBER по навыку ученика):
+    {id ученика: {id навыка: [оценки от новых к старым]}}.
+    Оценки более поздних папок в карточку не попадают
+    """
+    count = count or settings.PERSONAL_CARDS_SOFTSKILLS_MARKS_COUNT
+    marks = (
+        models.SoftSkillMark.objects
+        .filter(
+            card__student_id__in=students_ids,
+            card__batch__start_date__lte=start_date,
+            mark__isnull=False,
+        )
+        .select_related("card__batch")
+        .annotate(row_number=Window(
+            RowNumber(),
+            partition_by=[F("card__student_id"), F("skill_id")],
+            order_by=[F("card__batch__start_date").desc(), F("card_id").desc()],
+        ))
+        .filter(row_number__lte=count)
+        .order_by("card__student_id", "skill_id", "row_number")
+    )
+
+    marks_by_student = defaultdict(lambda: defaultdict(list))
+    for mark in marks:
+        marks_by_student[mark.card.student_id][mark.skill_id].append(mark)
+    return marks_by_student
+
+
+def get_test_result(test, summary):
+    """
+    Возвращает результат ученика за тест для таблицы результатов карточки
+    """
+    result = {"test": test, "basic_percent": "-", "reflexive_percent": "-"}
+    if summary is not None and not summary.empty_result:
+        result["basic_percent"] = summary.basic_percent
+        if test.with_reflexive_level:
+            result["reflexive_percent"] = summary.reflexive_percent
+    return result
+
+
+class BatchCardDataLoader:
+    """
+    Загружает данные всех карточек папки (или только cards) несколькими
+    групповыми запросами (тесты, итоги, темы для повторения, оценки навыков,
+    рекомендации и успехи) и формирует из них контексты карточек
+    """
+    def __init__(self, batch, cards=None):
+        self.batch = batch
+        if cards is None:
+            cards = (
+                batch.cards
+                .select_related("batch", "student__group__campus")
+                .order_by("id")
+            )
+        self.cards = list(cards)
+        self.students_ids = [card.student_id for card in self.cards]
+
+    # данные загружаются при первом обращении, поэтому разделы
+    # карточки запрашивают только то, что им нужно
+
+    @cached_property
+    def fragments(self):
+        return get_cards_fragments(self.cards)
+
+    @cached_property
+    def subjects(self):
+        return list(Subject.objects.all())
+
+    @cached_property
+    def softskills(self):
+        return list(models.SoftSkill.objects.all())
+
+    @cached_property
+    def tests_by_group(self):
+        return self._load_tests({card.student.group_id for card in self.cards})
+
+    @cached_property
+    def tests_ids(self):
+        return {
+            test.id
+            for tests in self.tests_by_group.values() for test in tests
+        }
+
+    @cached_property
+    def summaries(self):
+        return {
+            (summary.student_id, summary.test_id): summary
+            for summary in TestResultSummary.objects.filter(
+                student_id__in=self.students_ids, test_id__in=self.tests_ids,
+            )
+        }
+
+    @cached_property
+    def topics(self):
+        return self._load_topics(self.students_ids, self.tests_ids)
+
+    @cached_property
+    def softskills_marks(self):
+        return get_last_softskills_marks(self.students_ids, self.batch.start_date)
+
+    @cached_property
+    def recommendations(self):
+        return self._load_texts(models.PersonalRecommendations)
+
+    @cached_property
+    def strengths(self):
+        return self._load_texts(models.PersonalStrength)
+
+    def _load_tests(self, groups_ids):
+        """
+        Тесты, написанные классами с 1 сентября до конца отчетного периода
+        """
+        tests_by_group = defaultdict(list)
+        assigns = (
+            TestAssign.objects
+            .filter(
+                group_id__in=groups_ids,
+                writing_date__gte=get_studing_year_start(self.batch),
+                writing_date__lte=self.batch.end_date,
+            )
+            .select_related("test__subject")
+            .order_by("writing_date")
+        )
+        for assign in assigns:
+            tests_by_group[assign.group_id].append(assign.test)
+        return tests_by_group
+
+    def _load_topics(self, students_ids, tests_ids):
+        """
+        Темы заданий базового уровня с ошибками по ученикам и тестам
+        """
+        topics = defaultdict(set)
+        solutions = (
+            TaskSolution.objects
+            .filter(
+                student_id__in=students_ids,
+                task__test_id__in=tests_ids,
+                task__level=Task.BASIC,
+                result__lt=F("task__max_points"),
+            )
+            .values_list("student_id", "task__test_id", "task__checked_skill")
+            .distinct()
+        )
+        for student_id, test_id, skill in solutions:
+            topics[student_id, test_id].add(skill)
+        return topics
+
+    def _load_texts(self, model):
+        texts = defaultdict(dict)
+        for card_id, subject_name, text in (
+            model.objects
+            .filter(card__in=self.cards)
+            .order_by("id")
+            .values_list("card_id", "subject__name", "text")
+        ):
+            texts[card_id][subject_name] = text
+        return texts
+
+    def get_tests_results(self, card):
+        tests_by_subjects = {subject: [] for subject in self.subjects}
+        for test in self.tests_by_group[card.student.group_id]:
+            summary = self.summaries.get((card.student_id, test.id))
+            tests_by_subjects[test.subject].append(get_test_result(test, summary))
+        return tests_by_subjects
+
+    def get_repeat_topics(self, card):
+        topics = {subject: set() for subject in self.subjects}
+        for test in self.tests_by_group[card.student.group_id]:
+            topics[test.subject] |= self.topics[card.student_id, test.id]
+        return topics
+
+    def get_softskills_marks(self, card):
+        marks = self.softskills_marks[card.student_id]
+        return {skill: marks[skill.id] for skill in self.softskills}
+
+    def get_texts(self, texts, card):
+        """
+        Возвращает тексты карточки по всем предметам:
+        для незаполненных предметов строк в базе нет
+        """
+        card_texts = texts[card.id]
+        return {
+            subject.name: card_texts.get(subject.name)
+            for subject in self.subjects
+        }
+
+    def lazy(self, method, card):
+        """
+        Данные раздела вычисляются только при отрисовке, поэтому
+        для фрагментов, найденных в кэше, запросы не выполняются
+        """
+        return SimpleLazyObject(partial(method, card))
+
+    def get_pdf_context(self, card):
+        """
+        Возвращает контекст для формирования pdf-документа карточки
+        """
+        return {
+            "card": card,
+            "fragments": self.fragments[card.id],
+            "tests": self.lazy(self.get_tests_results, card),
+            "repeat_topics": self.lazy(self.get_repeat_topics, card),
+            "softskills": self.lazy(self.get_softskills_marks, card),
+            "recommendations": self.get_texts(self.recommendations, card),
+            "strengths": self.get_texts(self.strengths, card),
+        }
+
+
+class SnapshotCardDataLoader:
+    """
+    Загружает карточки архивной папки из снимков одним запросом.
+    Текущие данные (решения, оценки, рекомендации) запрашиваются
+    только для карточек без снимка (например, удаленного вручную)
+    """
+    def __init__(self, batch, cards=None):
+        self.batch = batch
+        if cards is None:
+            cards = (
+                batch.cards
+                .select_related("batch", "student__group__campus")
+                .order_by("id")
+            )
+        self.cards = list(cards)
+
+    @cached_property
+    def snapshots(self):
+        return {
+            snapshot.card_id: snapshot
+            for snapshot in models.CardSnapshot.objects.filter(card__in=self.cards)
+        }
+
+    @cached_property
+    def fragments(self):
+        # снимок не меняется, поэтому версия фрагментов - сам снимок
+        return {
+            card_id: {
+                "timeout": settings.PERSONAL_CARDS_FRAGMENTS_TIMEOUT,
+                "catalog": f"snapshot-{snapshot.pk}",
+                "solutions": f"snapshot-{snapshot.pk}",
+                "tests": f"snapshot-{snapshot.pk}",
+                "softskills": f"snapshot-{snapshot.pk}",
+            }
+            for card_id, snapshot in self.snapshots.items()
+        }
+
+    @cached_property
+    def live_loader(self):
+        return BatchCardDataLoader(self.batch, cards=[
+            card for card in self.cards if card.id not in self.snapshots
+        ])
+
+    def get_pdf_context(self, card):
+        snapshot = self.snapshots.get(card.id)
+        if snapshot is None:
+            return self.live_loader.get_pdf_context(card)
+
+        context = thaw_context(load_snapshot(snapshot))
+        context["fragments"] = self.fragments[card.id]
+        return context
+
+
+def get_card_data_loader(batch, cards=None):
+    """
+    Возвращает загрузчик данных карточек папки: для архивной
+    папки - из снимков, иначе - из текущих данных
+    """
+    if batch.is_archived:
+        return SnapshotCardDataLoader(batch, cards)
+    return BatchCardDataLoader(batch, cards)
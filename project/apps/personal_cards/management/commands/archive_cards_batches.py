@@ -0,0 +1,37 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from apps.personal_cards.models import CardsBatch
+from apps.personal_cards.services import archive_batch
+
+
+class Command(BaseCommand):
+    help = "Переносит в архив папки карточек, отчетный период которых закончился до даты"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--end-before",
+            type=datetime.date.fromisoformat,
+            required=True,
+            help="дата в формате ГГГГ-ММ-ДД",
+        )
+        parser.add_argument(
+            "--move-rows",
+            action="store_true",
+            help="перенести рекомендации и успехи из рабочих таблиц в снимки",
+        )
+
+    def handle(self, *args, **options):
+        batches = CardsBatch.objects.filter(
+            is_archived=False, end_date__lt=options["end_before"],
+        ).order_by("end_date")
+
+        archived = cards = 0
+        for batch in batches:
+            cards += archive_batch(batch, move_rows=options["move_rows"])
+            archived += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Перенесено в архив папок: {archived}, карточек: {cards}"
+        ))
@@ -0,0 +1,87 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.personal_cards.models import CardsBatch
+from apps.personal_cards.archives import stream_zip
+from apps.personal_cards.pdf import PROFILES, PdfRenderer
+from apps.personal_cards.services import get_batch_constructors, get_batch_html
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время верстки карточек папки: новый PdfRenderer "
+        "на каждую карточку, один PdfRenderer на всю папку "
+        "и один pdf-документ со всеми карточками; сравнивает размер "
+        "и время верстки карточек в профилях вывода"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("batch_id", type=int, help="id папки карточек")
+        parser.add_argument(
+            "--cards",
+            type=int,
+            default=10,
+            help="сколько карточек верстать (по умолчанию 10)",
+        )
+
+    def handle(self, *args, batch_id, cards, **options):
+        try:
+            batch = CardsBatch.objects.get(pk=batch_id)
+        except CardsBatch.DoesNotExist:
+            raise CommandError(f"Папка {batch_id} не найдена")
+
+        constructors = get_batch_constructors(batch)[:cards]
+        html_strings = [constructor.get_html() for constructor in constructors]
+        if not html_strings:
+            raise CommandError("В папке нет карточек")
+
+        # статические начертания шрифтов создаются при первом создании
+        # renderer и сохраняются на диск: это разовая подготовка,
+        # она не учитывается во времени верстки
+        started = time.perf_counter()
+        for profile in PROFILES:
+            PdfRenderer(profile=profile)
+        prepare = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for html_string in html_strings:
+            PdfRenderer().render(html_string)
+        separate = (time.perf_counter() - started) / len(html_strings)
+
+        started = time.perf_counter()
+        renderer = PdfRenderer()
+        for html_string in html_strings:
+            renderer.render(html_string)
+        shared = (time.perf_counter() - started) / len(html_strings)
+
+        batch_html = get_batch_html(constructors)
+        started = time.perf_counter()
+        PdfRenderer().render(batch_html)
+        single = (time.perf_counter() - started) / len(html_strings)
+
+        self.stdout.write(f"Карточек: {len(html_strings)}")
+        self.stdout.write(f"Подготовка renderer (шрифты): {prepare * 1000:.0f} мс")
+        self.stdout.write(f"Отдельный renderer: {separate * 1000:.0f} мс на карточку")
+        self.stdout.write(f"Общий renderer: {shared * 1000:.0f} мс на карточку")
+        self.stdout.write(f"Один документ: {single * 1000:.0f} мс на карточку")
+        self.stdout.write(self.style.SUCCESS(
+            f"Ускорение общего renderer: {separate / shared:.2f}x, "
+            f"одного документа: {separate / single:.2f}x"
+        ))
+
+        for profile in PROFILES:
+            renderer = PdfRenderer(profile=profile)
+            started = time.perf_counter()
+            pdfs = [renderer.render(html_string) for html_string in html_strings]
+            elapsed = (time.perf_counter() - started) / len(pdfs)
+            archive_size = sum(
+                len(chunk) for chunk in
+                stream_zip((f"{index}.pdf", pdf) for index, pdf in enumerate(pdfs))
+            )
+            self.stdout.write(
+                f"Профиль {profile}: "
+                f"{sum(map(len, pdfs)) / len(pdfs) / 1024:.0f} КБ "
+                f"и {elapsed * 1000:.0f} мс на карточку, "
+                f"архив {archive_size / 1024:.0f} КБ"
+            )
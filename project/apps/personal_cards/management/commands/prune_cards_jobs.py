@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.personal_cards.models import CardsRenderJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет завершенные задачи формирования карточек "
+        "вместе с их архивами и промежуточными pdf"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=7,
+            help="удалять задачи, завершенные раньше, чем столько дней назад",
+        )
+
+    def handle(self, *args, days=7, **options):
+        expired = timezone.now() - datetime.timedelta(days=days)
+        removed, _ = CardsRenderJob.objects.filter(
+            status__in=[CardsRenderJob.DONE, CardsRenderJob.FAILED],
+            updated_at__lt=expired,
+        ).delete()
+
+        self.stdout.write(self.style.SUCCESS(f"Удалено задач: {removed}"))
@@ -0,0 +1,25 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.personal_cards.models import PersonalCard
+from apps.personal_cards.store import STORE_DIR
+
+
+class Command(BaseCommand):
+    help = "Удаляет из хранилища pdf-документы, на которые не ссылается ни одна карточка"
+
+    def handle(self, *args, **options):
+        used = set(
+            PersonalCard.objects.exclude(pdf_hash="")
+            .values_list("pdf_hash", flat=True)
+        )
+
+        removed = 0
+        for path in (Path(settings.MEDIA_ROOT) / STORE_DIR).glob("*/*.pdf"):
+            if path.stem not in used:
+                path.unlink()
+                removed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Удалено документов: {removed}"))
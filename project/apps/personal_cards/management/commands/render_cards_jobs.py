@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.personal_cards.jobs import run_next_job
+from apps.personal_cards.models import CardsRenderJob
+
+
+class Command(BaseCommand):
+    help = "Выполняет фоновые задачи формирования pdf-карточек (CardsRenderJob)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="выполнить задачи из очереди и завершиться",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2,
+            help="пауза между проверками пустой очереди в секундах",
+        )
+
+    def handle(self, *args, once=False, sleep=2, **options):
+        while True:
+            job = run_next_job()
+            if job is None:
+                if once:
+                    break
+                time.sleep(sleep)
+                continue
+
+            if job.status == CardsRenderJob.DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Задача {job.id}: сформировано карточек {job.cards_done}"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f"Задача {job.id}: {job.error}"
+                ))
@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-18 07:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personal_cards', '0007_alter_personalcard_batch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardsRenderJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='queued', max_length=10, verbose_name='статус')),
+                ('cards_total', models.PositiveIntegerField(default=0, verbose_name='всего карточек')),
+                ('cards_done', models.PositiveIntegerField(default=0, verbose_name='сформировано карточек')),
+                ('archive', models.FileField(blank=True, upload_to='personal_cards/jobs/', verbose_name='архив')),
+                ('error', models.TextField(blank=True, verbose_name='ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создана')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='обновлена')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='render_jobs', to='personal_cards.cardsbatch', verbose_name='папка карточек')),
+            ],
+            options={
+                'verbose_name': 'Задача формирования карточек',
+                'verbose_name_plural': 'Задачи формирования карточек',
+            },
+        ),
+    ]
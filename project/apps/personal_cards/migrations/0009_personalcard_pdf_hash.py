@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 07:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personal_cards', '0008_cardsrenderjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='personalcard',
+            name='pdf_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='хэш сформированного pdf-документа'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+def remove_empty_rows(apps, schema_editor):
+    """
+    Удаляет незаполненные рекомендации, успехи и оценки навыков,
+    а из повторяющихся строк карточки оставляет последнюю созданную
+    """
+    for model_name, key, value in [
+        ("PersonalRecommendations", "subject", "text"),
+        ("PersonalStrength", "subject", "text"),
+        ("SoftSkillMark", "skill", "mark"),
+    ]:
+        model = apps.get_model("personal_cards", model_name)
+        model.objects.filter(
+            models.Q(**{f"{value}__isnull": True}) | models.Q(**{value: ""})
+        ).delete()
+
+        duplicates = (
+            model.objects
+            .order_by()
+            .values("card", key)
+            .annotate(count=models.Count("id"), last_id=models.Max("id"))
+            .filter(count__gt=1)
+        )
+        for duplicate in duplicates.iterator():
+            model.objects.filter(
+                card=duplicate["card"], **{key: duplicate[key]}
+            ).exclude(id=duplicate["last_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personal_cards', '0009_personalcard_pdf_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_empty_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='personalrecommendations',
+            constraint=models.UniqueConstraint(fields=('card', 'subject'), name='unique_recommendation_subject'),
+        ),
+        migrations.AddConstraint(
+            model_name='personalstrength',
+            constraint=models.UniqueConstraint(fields=('card', 'subject'), name='unique_strength_subject'),
+        ),
+        migrations.AddConstraint(
+            model_name='softskillmark',
+            constraint=models.UniqueConstraint(fields=('card', 'skill'), name='unique_softskill_mark'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 07:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('personal_cards', '0010_sparse_card_rows'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField(verbose_name='сжатый контекст карточки')),
+                ('rows_moved', models.BooleanField(default=False, verbose_name='рекомендации и успехи перенесены в снимок')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создан')),
+                ('card', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='personal_cards.personalcard', verbose_name='карточка')),
+            ],
+            options={
+                'verbose_name': 'Снимок карточки',
+                'verbose_name_plural': 'Снимки карточек',
+            },
+        ),
+    ]
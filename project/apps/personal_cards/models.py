@@ -1,4 +1,7 @@
+import datetime
+
 from django.db import models
+from django.utils import timezone
 
 from apps.core.models import Student, Subject, Group
 
@@ -41,6 +44,12 @@ class PersonalCard(models.Model):
         related_name="personal_cards",
         verbose_name="ученик"
     )
+    pdf_hash = models.CharField(
+        "хэш сформированного pdf-документа",
+        max_length=64,
+        blank=True,
+        editable=False,
+    )
     
     class Meta:
         verbose_name = "Личная карточка"
@@ -80,6 +89,13 @@ class PersonalRecommendations(models.Model):
     class Meta:
         verbose_name = "Персональная рекомендация"
         verbose_name_plural = "Персональные рекомендации"
+        # строка создается только после заполнения рекомендации
+        constraints = [
+            models.UniqueConstraint(
+                fields=["card", "subject"],
+                name="unique_recommendation_subject",
+            ),
+        ]
 
 
 class PersonalStrength(models.Model):
@@ -108,6 +124,13 @@ class PersonalStrength(models.Model):
     class Meta:
         verbose_name = "Заметка о проявленных успехах"
         verbose_name_plural = "Проявленные успехи"
+        # строка создается только после заполнения заметки
+        constraints = [
+            models.UniqueConstraint(
+                fields=["card", "subject"],
+                name="unique_strength_subject",
+            ),
+        ]
 
 
 class SoftSkill(models.Model):
@@ -161,3 +184,126 @@ class SoftSkillMark(models.Model):
     class Meta:
         verbose_name = "Оценка межпредметного навыка"
         verbose_name_plural = "Оценки межпредметных навыков"
+        # строка создается только после выставления оценки
+        constraints = [
+            models.UniqueConstraint(
+                fields=["card", "skill"],
+                name="unique_softskill_mark",
+            ),
+        ]
+
+
+class CardSnapshot(models.Model):
+    """
+    Замороженный контекст карточки архивной папки (сжатый JSON).
+    Архивная карточка отображается только по снимку, поэтому
+    не меняется вместе с текущими данными. См. snapshots.py
+    """
+    card = models.OneToOneField(
+        PersonalCard,
+        on_delete=models.CASCADE,
+        related_name="snapshot",
+        verbose_name="карточка",
+    )
+    data = models.BinaryField("сжатый контекст карточки")
+    rows_moved = models.BooleanField(
+        "рекомендации и успехи перенесены в снимок",
+        default=False,
+    )
+    created_at = models.DateTimeField("создан", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Снимок карточки"
+        verbose_name_plural = "Снимки карточек"
+
+
+class CardsRenderJobManager(models.Manager):
+    def claim_next(self):
+        """
+        Забирает на выполнение самую старую задачу из очереди
+        или задачу, обработчик которой перестал отвечать.
+        Возвращает задачу или None, если задач нет
+        """
+        stale = timezone.now() - CardsRenderJob.STALE_AFTER
+        candidates = self.filter(
+            models.Q(status=CardsRenderJob.QUEUED)
+            | models.Q(status=CardsRenderJob.RUNNING, updated_at__lt=stale)
+        ).order_by("created_at")
+
+        for job in candidates[:10]:
+            # условное обновление: задачу забирает только один обработчик
+            claimed = self.filter(
+                pk=job.pk, status=job.status, updated_at=job.updated_at,
+            ).update(status=CardsRenderJob.RUNNING, updated_at=timezone.now())
+            if claimed:
+                job.refresh_from_db()
+                return job
+        return None
+
+
+class CardsRenderJob(models.Model):
+    """
+    Фоновая задача формирования архива pdf-карточек папки.
+    Выполняется командой render_cards_jobs
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "В очереди"),
+        (RUNNING, "Выполняется"),
+        (DONE, "Готово"),
+        (FAILED, "Ошибка"),
+    ]
+    # задача в работе без отметок о прогрессе дольше этого времени
+    # считается брошенной и может быть взята другим обработчиком
+    STALE_AFTER = datetime.timedelta(minutes=10)
+
+    batch = models.ForeignKey(
+        CardsBatch,
+        on_delete=models.CASCADE,
+        related_name="render_jobs",
+        verbose_name="папка карточек",
+    )
+    status = models.CharField(
+        "статус",
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    cards_total = models.PositiveIntegerField(
+        "всего карточек",
+        default=0,
+    )
+    cards_done = models.PositiveIntegerField(
+        "сформировано карточек",
+        default=0,
+    )
+    archive = models.FileField(
+        "архив",
+        upload_to="personal_cards/jobs/",
+        blank=True,
+    )
+    error = models.TextField(
+        "ошибка",
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        "создана",
+        auto_now_add=True,
+    )
+    updated_at = models.DateTimeField(
+        "обновлена",
+        auto_now=True,
+    )
+
+    objects = CardsRenderJobManager()
+
+    class Meta:
+        verbose_name = "Задача формирования карточек"
+        verbose_name_plural = "Задачи формирования карточек"
+
+    @property
+    def is_active(self):
+        return self.status in (self.QUEUED, self.RUNNING)
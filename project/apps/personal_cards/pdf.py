@@ -0,0 +1,201 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+import os
+import threading
+
+from django.conf import settings
+from weasyprint import CSS, HTML, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
+
+from apps.personal_cards.fonts import replace_variable_fonts
+
+
+STYLESHEET = "static_dev/css/styles.css"
+
+# параметры write_pdf для профилей вывода (PERSONAL_CARDS_PDF_PROFILE).
+# Подмножества шрифтов без хинтинга и сжатие потоков WeasyPrint включает
+# по умолчанию. Основное отличие compact - замена вариативных шрифтов
+# статическими начертаниями, чтобы во встроенные подмножества
+# не попадали таблицы вариаций
+PROFILES = {
+    "default": {},
+    "compact": {
+        "optimize_images": True,
+    },
+}
+
+
+class PdfRenderer:
+    """
+    Верстает pdf-документы карточек с общим для всех документов состоянием:
+    таблица стилей разбирается один раз, шрифты из @font-face загружаются
+    в одну FontConfiguration, а локальные файлы (шрифты, изображения)
+    читаются с диска один раз через кэширующий url_fetcher
+    """
+    def __init__(self, base_url=None, profile=None):
+        self.base_url = str(base_url or settings.BASE_DIR)
+        self.profile = profile or settings.PERSONAL_CARDS_PDF_PROFILE
+        self.options = PROFILES[self.profile]
+        self.font_config = FontConfiguration()
+        self.images_cache = {}
+        self._fetched = {}
+        self.stylesheets = [self._get_stylesheet()]
+
+    def _get_stylesheet(self):
+        path = os.path.join(self.base_url, STYLESHEET)
+        with open(path, encoding="utf-8") as file:
+            css_text = file.read()
+        if self.profile == "compact":
+            css_text = replace_variable_fonts(css_text, path)
+
+        return CSS(
+            string=css_text,
+            base_url=path,
+            font_config=self.font_config,
+            url_fetcher=self.url_fetcher,
+        )
+
+    def url_fetcher(self, url, *args, **kwargs):
+        if not url.startswith("file:"):
+            return default_url_fetcher(url, *args, **kwargs)
+
+        if url not in self._fetched:
+            result = default_url_fetcher(url, *args, **kwargs)
+            if "file_obj" in result:
+                with result.pop("file_obj") as file_obj:
+                    result["string"] = file_obj.read()
+            self._fetched[url] = result
+        return dict(self._fetched[url])
+
+    def render(self, html_string, **options):
+        """
+        Возвращает pdf-документ, сверстанный из html_string,
+        в виде последовательности байтов
+        """
+        html = HTML(
+            string=html_string,
+            base_url=self.base_url,
+            url_fetcher=self.url_fetcher,
+        )
+        return html.write_pdf(
+            stylesheets=self.stylesheets,
+            font_config=self.font_config,
+            cache=self.images_cache,
+            **{**self.options, **options},
+        )
+
+
+# FontConfiguration и кэши PdfRenderer не рассчитаны на одновременную
+# верстку в нескольких потоках, поэтому у каждого потока свой renderer
+_renderers = threading.local()
+
+
+def get_renderer():
+    """
+    Возвращает PdfRenderer текущего потока. Процессы-обработчики
+    render_pdfs создают собственный renderer и переиспользуют его
+    для всех своих документов
+    """
+    key = (os.getpid(), settings.PERSONAL_CARDS_PDF_PROFILE)
+    if getattr(_renderers, "key", None) != key:
+        _renderers.renderer = PdfRenderer()
+        _renderers.key = key
+    return _renderers.renderer
+
+
+def render_pdf(html_string):
+    """
+    Возвращает pdf-документ, сверстанный из html_string,
+    в виде последовательности байтов
+    """
+    return get_renderer().render(html_string)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Возвращает общий для всех запросов пул процессов верстки
+    текущего процесса сервера
+    """
+    key = (os.getpid(), settings.PERSONAL_CARDS_PDF_WORKERS)
+    with _pools_lock:
+        if key not in _pools:
+            _pools.clear()
+            _pools[key] = ProcessPoolExecutor(
+                max_workers=settings.PERSONAL_CARDS_PDF_WORKERS
+            )
+        return _pools[key]
+
+
+def _get_workers(pool):
+    """
+    Возвращает процессы пула. shutdown не прерывает уже выполняющиеся
+    задачи, а публичного способа остановить зависший процесс верстки
+    у ProcessPoolExecutor нет, поэтому здесь (и только здесь)
+    используется внутренний атрибут _processes
+    """
+    return list((getattr(pool, "_processes", None) or {}).values())
+
+
+def terminate_pool(pool):
+    """
+    Останавливает пул: задачи в очереди отменяются, процессы,
+    зависшие на верстке, завершаются. Следующий запрос создаст новый пул
+    """
+    with _pools_lock:
+        for key, value in list(_pools.items()):
+            if value is pool:
+                del _pools[key]
+
+    workers = _get_workers(pool)
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in workers:
+        if process.is_alive():
+            process.terminate()
+
+
+def render_pdfs(html_strings):
+    """
+    Генератор pdf-документов в порядке html_strings.
+    Если PERSONAL_CARDS_PDF_WORKERS больше 1, документы верстаются
+    параллельно в общем пуле процессов. Документ, который не успел
+    сверстаться за PERSONAL_CARDS_PDF_TIMEOUT секунд, вызывает TimeoutError,
+    процессы пула при этом завершаются
+    """
+    workers = settings.PERSONAL_CARDS_PDF_WORKERS
+    
+    if workers <= 1 or len(html_strings) <= 1:
+        for html_string in html_strings:
+            yield render_pdf(html_string)
+        return
+    
+    # в работе одновременно не больше workers документов, чтобы готовые
+    # pdf не накапливались в памяти, пока их медленно забирают
+    pool = get_pool()
+    html_iter = iter(html_strings)
+    pending = deque()
+    try:
+        pending.extend(
+            pool.submit(render_pdf, html_string)
+            for html_string in islice(html_iter, workers)
+        )
+        while pending:
+            pdf = pending.popleft().result(
+                timeout=settings.PERSONAL_CARDS_PDF_TIMEOUT
+            )
+            html_string = next(html_iter, None)
+            if html_string is not None:
+                pending.append(pool.submit(render_pdf, html_string))
+            yield pdf
+    except (TimeoutError, BrokenProcessPool):
+        terminate_pool(pool)
+        raise
+    finally:
+        # документы, которые уже не нужны, не верстаются
+        for future in pending:
+            future.cancel()
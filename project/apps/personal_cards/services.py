@@ -0,0 +1,276 @@
+from collections import defaultdict
+from itertools import islice
+from urllib.parse import quote
+import time
+
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.functional import cached_property
+
+from apps.core.models import Student
+from apps.personal_cards import models
+from apps.personal_cards.loaders import BatchCardDataLoader, get_card_data_loader
+from apps.personal_cards.pdf import render_pdf
+from apps.personal_cards.snapshots import freeze_context, load_snapshot
+
+
+# количество строк, которое создается одним запросом
+CREATE_BATCH_SIZE = 500
+
+
+def _bulk_create_chunked(model, objects, batch_size):
+    """
+    Создает объекты из генератора objects порциями по batch_size.
+    Возвращает количество созданных объектов
+    """
+    created = 0
+    while chunk := list(islice(objects, batch_size)):
+        model.objects.bulk_create(chunk, batch_size=batch_size)
+        created += len(chunk)
+    return created
+
+
+def create_batches(groups, start_date, end_date, batch_size=CREATE_BATCH_SIZE):
+    """
+    Создает для каждого класса groups папку карточек за период
+    с карточками всех учеников. Рекомендации, успехи и оценки навыков
+    создаются позже, при заполнении карточки. Все записи создаются
+    в одной транзакции.
+    Возвращает количество созданных записей каждого вида и время работы
+    """
+    started = time.perf_counter()
+    groups = list(groups)
+    students = (
+        Student.objects.filter(group__in=groups)
+        .order_by("group_id", "id")
+        .values_list("id", "group_id")
+    )
+
+    with transaction.atomic():
+        batches = models.CardsBatch.objects.bulk_create(
+            [
+                models.CardsBatch(group=group, start_date=start_date, end_date=end_date)
+                for group in groups
+            ],
+            batch_size=batch_size,
+        )
+        batch_by_group = {batch.group_id: batch for batch in batches}
+
+        counts = {
+            "batches": len(batches),
+            "cards": _bulk_create_chunked(
+                models.PersonalCard,
+                (
+                    models.PersonalCard(
+                        batch=batch_by_group[group_id], student_id=student_id,
+                    )
+                    for student_id, group_id in students.iterator()
+                ),
+                batch_size,
+            ),
+        }
+
+    counts["seconds"] = time.perf_counter() - started
+    return counts
+
+
+# строки карточки, которые при архивации можно перенести в снимок.
+# Оценки навыков остаются в рабочей таблице: они показываются
+# в последующих карточках ученика
+MOVABLE_ROWS = {
+    "recommendations": models.PersonalRecommendations,
+    "strengths": models.PersonalStrength,
+}
+
+
+def _get_cards_rows(batch):
+    """
+    Возвращает строки рекомендаций и успехов карточек папки:
+    {id карточки: {"recommendations": [[id предмета, текст]], ...}}
+    """
+    rows = defaultdict(lambda: {name: [] for name in MOVABLE_ROWS})
+    for name, model in MOVABLE_ROWS.items():
+        for card_id, subject_id, text in (
+            model.objects.filter(card__batch=batch)
+            .order_by("id")
+            .values_list("card_id", "subject_id", "text")
+        ):
+            rows[card_id][name].append([subject_id, text])
+    return rows
+
+
+def archive_batch(batch, move_rows=False):
+    """
+    Архивирует папку: контекст каждой карточки сохраняется в снимок,
+    и дальше карточки отображаются только по нему. Если move_rows,
+    рекомендации и успехи карточек удаляются из рабочих таблиц
+    (их можно восстановить из снимков при разархивации).
+    Снимки строятся в той же транзакции, в которой удаляются строки,
+    поэтому изменения, сделанные во время архивации, не теряются.
+    Оценки навыков берутся только из этой и более ранних папок ученика,
+    поэтому снимок не зависит от папок, созданных позже.
+    Возвращает количество созданных снимков
+    """
+    with transaction.atomic():
+        batch = models.CardsBatch.objects.select_for_update().get(pk=batch.pk)
+        if batch.is_archived:
+            return 0
+
+        loader = BatchCardDataLoader(batch)
+        rows = _get_cards_rows(batch)
+        snapshots = [
+            models.CardSnapshot(
+                card=card,
+                data=freeze_context(loader.get_pdf_context(card), rows.get(card.id)),
+                rows_moved=move_rows,
+            )
+            for card in loader.cards
+        ]
+
+        models.CardSnapshot.objects.filter(card__batch=batch).delete()
+        models.CardSnapshot.objects.bulk_create(snapshots, batch_size=CREATE_BATCH_SIZE)
+        if move_rows:
+            for model in MOVABLE_ROWS.values():
+                model.objects.filter(card__batch=batch).delete()
+
+        batch.is_archived = True
+        batch.save(update_fields=["is_archived"])
+        # сохраненные pdf сверстаны по текущим данным, а не по снимкам
+        models.PersonalCard.objects.filter(batch=batch).update(pdf_hash="")
+
+    return len(snapshots)
+
+
+def unarchive_batch(batch):
+    """
+    Возвращает папку к работе с текущими данными: перенесенные
+    в снимки строки восстанавливаются, снимки удаляются
+    """
+    snapshots = models.CardSnapshot.objects.filter(card__batch=batch, rows_moved=True)
+
+    with transaction.atomic():
+        for snapshot in snapshots.iterator():
+            rows = load_snapshot(snapshot)["rows"]
+            for name, model in MOVABLE_ROWS.items():
+                model.objects.bulk_create(
+                    [
+                        model(card_id=snapshot.card_id, subject_id=subject_id, text=text)
+                        for subject_id, text in rows.get(name, [])
+                    ],
+                    ignore_conflicts=True,
+                )
+        models.CardSnapshot.objects.filter(card__batch=batch).delete()
+
+        batch.is_archived = False
+        batch.save(update_fields=["is_archived"])
+        # текущие данные могли измениться, pdf верстаются заново
+        models.PersonalCard.objects.filter(batch=batch).update(pdf_hash="")
+
+
+class CardConstructorMixin:
+    """
+    Предоставляет методы для формирования личных карточек.
+    Предполагает наличие атрибута self.card
+    """
+
+    @cached_property
+    def loader(self):
+        """
+        Данные карточки загружаются тем же загрузчиком, что и для папки,
+        поэтому их получение занимает постоянное число запросов.
+        Карточки архивной папки загружаются из снимков
+        """
+        return get_card_data_loader(self.card.batch, cards=[self.card])
+
+    def get_repeat_topics(self):
+        """
+        Возвращает темы заданий базового уровня с ошибками
+        (не максимальный балл) из тестов, написанных в отчётный период
+        """
+        return self.loader.get_repeat_topics(self.card)
+
+    def get_tests_results(self):
+        return self.loader.get_tests_results(self.card)
+
+    def get_softskills_marks(self):
+        return self.loader.get_softskills_marks(self.card)
+
+    def get_recommendations(self):
+        return self.loader.get_texts(self.loader.recommendations, self.card)
+
+    def get_strengths(self):
+        return self.loader.get_texts(self.loader.strengths, self.card)
+
+    def get_fragments(self):
+        return self.loader.fragments[self.card.id]
+
+    def get_pdf_context(self):
+        """
+        Возвращает контекст для формирования pdf-документа
+        """
+        return self.loader.get_pdf_context(self.card)
+
+    def get_html(self):
+        """
+        Возвращает html-разметку pdf-документа
+        """
+        return render_to_string(
+            template_name="personal_cards/personal_card_pdf.html",
+            context=self.get_pdf_context(),
+        )
+
+    def get_pdf(self):
+        """
+        Возвращает pdf-документ в виде последовательности байтов
+        """
+        return render_pdf(self.get_html())
+
+    def get_filename(self):
+        return (
+            f"{self.card.student.surname} {self.card.student.name} "
+            f"от {self.card.batch.start_date}.pdf"
+        )
+
+    def get_pdf_filename(self):
+        return quote(self.get_filename())
+
+
+class CardConstructor(CardConstructorMixin):
+    """
+    Самостоятельный класс для отображения карточки.
+    Если передан pdf_context (например, из загрузчика папки),
+    данные карточки повторно не запрашиваются
+    """
+    def __init__(self, card, pdf_context=None):
+        self.card = card
+        self.pdf_context = pdf_context
+
+    def get_pdf_context(self):
+        if self.pdf_context is not None:
+            return self.pdf_context
+        return super().get_pdf_context()
+
+
+def get_batch_constructors(batch):
+    """
+    Возвращает конструкторы всех карточек папки с данными,
+    загруженными одним загрузчиком (для архивной папки - из снимков)
+    """
+    loader = get_card_data_loader(batch)
+    return [
+        CardConstructor(card, loader.get_pdf_context(card))
+        for card in loader.cards
+    ]
+
+
+def get_batch_html(constructors):
+    """
+    Возвращает html-разметку одного pdf-документа со всеми карточками
+    constructors, каждая карточка начинается с новой страницы
+    """
+    return render_to_string(
+        template_name="personal_cards/batch_pdf.html",
+        context={
+            "cards": [constructor.get_pdf_context() for constructor in constructors]
+        },
+    )
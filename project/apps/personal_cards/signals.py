@@ -0,0 +1,173 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.core.models import Campus, Group, Student, Subject
+from apps.personal_cards import fragments
+from apps.personal_cards.jobs import delete_job_files
+from apps.personal_cards.models import (
+    CardsBatch,
+    CardsRenderJob,
+    PersonalCard,
+    PersonalRecommendations,
+    PersonalStrength,
+    SoftSkill,
+    SoftSkillMark,
+)
+from apps.tests_app.models import TaskSolution
+from apps.tests_app.signals import solutions_changed
+from apps.tests_management.models import Task, Test, TestAssign
+from apps.tests_management.signals import test_totals_changed
+
+
+# Сохраненный pdf карточки сбрасывается при изменении любых данных,
+# которые в него попадают: следующее скачивание сверстает его заново.
+# Карточки архивных папок отображаются по снимкам и не сбрасываются
+
+
+def invalidate_cards(**filters):
+    (
+        PersonalCard.objects.filter(**filters)
+        .exclude(pdf_hash="")
+        .exclude(batch__is_archived=True)
+        .update(pdf_hash="")
+    )
+
+
+# Кэшированные фрагменты карточек (card_parts/*.html) сбрасываются
+# сменой версии данных, от которых они зависят (см. fragments.py)
+
+
+def bump_tests_fragments(test):
+    """test - тест или его id"""
+    groups_ids = TestAssign.objects.filter(test=test).values_list("group_id", flat=True)
+    fragments.bump_versions([fragments.tests_key(group_id) for group_id in groups_ids])
+
+
+@receiver(post_save, sender=TaskSolution)
+def invalidate_on_solution_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cards(student_id=instance.student_id)
+    fragments.bump_versions([fragments.solutions_key(instance.student_id)])
+
+
+@receiver(solutions_changed)
+def invalidate_on_solutions_change(sender, test, student_ids, **kwargs):
+    if student_ids is None:
+        invalidate_cards(student__group__testassign__test=test)
+        bump_tests_fragments(test)
+    else:
+        invalidate_cards(student_id__in=student_ids)
+        fragments.bump_versions(
+            [fragments.solutions_key(student_id) for student_id in student_ids]
+        )
+
+
+@receiver(test_totals_changed)
+@receiver(post_save, sender=Test)
+def invalidate_on_test_change(sender, instance=None, test=None, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cards(student__group__testassign__test=test or instance)
+    bump_tests_fragments(test or instance)
+
+
+@receiver(post_save, sender=TestAssign)
+@receiver(post_delete, sender=TestAssign)
+def invalidate_on_assign_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cards(student__group_id=instance.group_id)
+    # в том числе при переносе даты написания (writing_date)
+    fragments.bump_versions([fragments.tests_key(instance.group_id)])
+
+
+@receiver(post_save, sender=SoftSkillMark)
+@receiver(post_delete, sender=SoftSkillMark)
+def invalidate_on_softskill_mark_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # в карточке показываются оценки ученика и из предыдущих карточек
+    invalidate_cards(student__personal_cards=instance.card_id)
+    student_id = (
+        PersonalCard.objects.filter(pk=instance.card_id)
+        .values_list("student_id", flat=True).first()
+    )
+    # при удалении карточки версию сбрасывает bump_on_card_delete
+    if student_id is not None:
+        fragments.bump_versions([fragments.softskills_key(student_id)])
+
+
+@receiver(post_delete, sender=PersonalCard)
+def bump_on_card_delete(sender, instance, **kwargs):
+    # оценки удаленной карточки пропадают из истории навыков ученика
+    fragments.bump_versions([fragments.softskills_key(instance.student_id)])
+
+
+@receiver(post_save, sender=PersonalRecommendations)
+@receiver(post_save, sender=PersonalStrength)
+def invalidate_on_card_notes_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cards(pk=instance.card_id)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_on_task_change(sender, instance, raw=False, **kwargs):
+    # тема и уровень задания влияют на темы для повторения,
+    # даже если суммы баллов теста не изменились
+    if raw:
+        return
+    invalidate_cards(student__group__testassign__test_id=instance.test_id)
+    bump_tests_fragments(instance.test_id)
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=SoftSkill)
+@receiver(post_delete, sender=SoftSkill)
+def invalidate_on_catalog_change(sender, instance, raw=False, **kwargs):
+    # предметы и навыки - столбцы и строки всех карточек
+    if raw:
+        return
+    invalidate_cards()
+    fragments.bump_versions([fragments.catalog_key()])
+
+
+@receiver(post_save, sender=Student)
+def invalidate_on_student_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cards(student_id=instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def invalidate_on_group_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cards(student__group_id=instance.pk)
+
+
+@receiver(post_save, sender=Campus)
+def invalidate_on_campus_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cards(student__group__campus_id=instance.pk)
+
+
+@receiver(post_save, sender=CardsBatch)
+def invalidate_on_batch_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_cards(batch_id=instance.pk)
+    # даты папки показываются в истории оценок навыков учеников
+    students_ids = instance.cards.values_list("student_id", flat=True)
+    fragments.bump_versions(
+        [fragments.softskills_key(student_id) for student_id in students_ids]
+    )
+
+
+@receiver(post_delete, sender=CardsRenderJob)
+def delete_render_job_files(sender, instance, **kwargs):
+    delete_job_files(instance)
@@ -0,0 +1,123 @@
+"""
+Снимки карточек архивных папок: контекст pdf-документа карточки
+сохраняется в виде сжатого JSON и при отображении восстанавливается
+в объекты с теми же атрибутами, которые используют шаблоны card_parts
+"""
+from collections import namedtuple
+from types import SimpleNamespace
+import datetime
+import json
+import zlib
+
+
+SNAPSHOT_VERSION = 1
+
+# предмет или навык: в шаблонах используется только название
+Named = namedtuple("Named", ["name"])
+
+
+def freeze_context(context, rows=None):
+    """
+    Возвращает сжатый JSON контекста карточки context
+    (см. BatchCardDataLoader.get_pdf_context). rows - строки
+    рекомендаций и успехов для восстановления при разархивации
+    """
+    card = context["card"]
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "card": {
+            "id": card.id,
+            "surname": card.student.surname,
+            "name": card.student.name,
+            "group": str(card.student.group),
+            "start_date": card.batch.start_date.isoformat(),
+            "end_date": card.batch.end_date.isoformat(),
+        },
+        "tests": [
+            [subject.name, [
+                {
+                    "name": result["test"].name,
+                    "month": result["test"].get_month_display(),
+                    "basic_percent": result["basic_percent"],
+                    "reflexive_percent": result["reflexive_percent"],
+                }
+                for result in results
+            ]]
+            for subject, results in context["tests"].items()
+        ],
+        "repeat_topics": [
+            [str(subject), list(topics)]
+            for subject, topics in context["repeat_topics"].items()
+        ],
+        "softskills": [
+            [skill.name, [
+                [mark.mark, mark.card.batch.start_date.isoformat()]
+                for mark in marks
+            ]]
+            for skill, marks in context["softskills"].items()
+        ],
+        "recommendations": list(context["recommendations"].items()),
+        "strengths": list(context["strengths"].items()),
+        "rows": rows or {},
+    }
+    content = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(content.encode(), level=9)
+
+
+def load_snapshot(snapshot):
+    return json.loads(zlib.decompress(bytes(snapshot.data)))
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value)
+
+
+def thaw_context(data):
+    """
+    Восстанавливает контекст карточки из данных снимка
+    """
+    card_data = data["card"]
+    card = SimpleNamespace(
+        id=card_data["id"],
+        student=SimpleNamespace(
+            surname=card_data["surname"],
+            name=card_data["name"],
+            group=card_data["group"],
+        ),
+        batch=SimpleNamespace(
+            start_date=_date(card_data["start_date"]),
+            end_date=_date(card_data["end_date"]),
+        ),
+    )
+    return {
+        "card": card,
+        "tests": {
+            Named(subject): [
+                {
+                    "test": SimpleNamespace(
+                        name=result["name"],
+                        get_month_display=result["month"],
+                    ),
+                    "basic_percent": result["basic_percent"],
+                    "reflexive_percent": result["reflexive_percent"],
+                }
+                for result in results
+            ]
+            for subject, results in data["tests"]
+        },
+        "repeat_topics": dict(data["repeat_topics"]),
+        "softskills": {
+            Named(skill): [
+                SimpleNamespace(
+                    mark=mark,
+                    card=SimpleNamespace(
+                        batch=SimpleNamespace(start_date=_date(start_date))
+                    ),
+                )
+                for mark, start_date in marks
+            ]
+            for skill, marks in data["softskills"]
+        },
+        "recommendations": dict(data["recommendations"]),
+        "strengths": dict(data["strengths"]),
+    }
@@ -0,0 +1,61 @@
+// Разделы личной карточки: результаты проверочных и темы для повторения
+// подгружаются отдельными запросами, каждое поле сохраняется само по себе
+const csrfToken = document.querySelector("[name=csrfmiddlewaretoken]").value;
+const statusLine = document.querySelector("#card-save-status");
+
+document.querySelectorAll("[data-section-url]").forEach(loadSection);
+
+async function loadSection(element) {
+    try {
+        const response = await fetch(element.dataset.sectionUrl);
+        if (!response.ok) throw new Error(response.statusText);
+        element.innerHTML = await response.text();
+    } catch (error) {
+        element.textContent = "Не удалось загрузить раздел";
+    }
+}
+
+document.addEventListener("change", async (e) => {
+    const input = e.target;
+    const cell = input.closest("[data-save-url]");
+    if (!cell) return;
+
+    // поле формсета называется "<префикс>-<номер>-<поле>"
+    const field = input.name.split("-").pop();
+    const data = new FormData();
+    data.append(field, input.value);
+
+    input.classList.remove("cell-saved", "cell-error");
+    input.classList.add("cell-unsaved");
+    statusLine.textContent = "Сохранение...";
+    try {
+        const response = await fetch(cell.dataset.saveUrl, {
+            method: "POST",
+            headers: {"X-CSRFToken": csrfToken},
+            body: data,
+        });
+        const result = await response.json();
+        input.classList.remove("cell-unsaved");
+        if (!response.ok) {
+            input.classList.add("cell-error");
+            input.title = Object.values(result.errors).flat().join(" ");
+            statusLine.textContent = "Ошибка сохранения";
+            return;
+        }
+        input.classList.add("cell-saved");
+        input.title = "";
+        statusLine.textContent = "Изменения сохранены";
+
+        // у новой строки появился id: он проставляется в скрытое поле формы,
+        // чтобы при отправке формы строка не создавалась повторно
+        if (result.created) {
+            const idName = input.name.replace(/-[^-]+$/, "-id");
+            const idInput = input.form.querySelector(`[name="${idName}"]`);
+            if (idInput) idInput.value = result.id;
+        }
+    } catch (error) {
+        input.classList.remove("cell-unsaved");
+        input.classList.add("cell-error");
+        statusLine.textContent = "Ошибка сохранения";
+    }
+});
@@ -0,0 +1,48 @@
+// Фоновое формирование архива карточек: задача ставится в очередь,
+// страница опрашивает ее состояние до готовности архива
+const POLL_MS = 2000;
+
+const startButton = document.querySelector("#start-cards-job");
+const statusLine = document.querySelector("#cards-job-status");
+const csrfToken = document.querySelector("[name=csrfmiddlewaretoken]").value;
+
+startButton.addEventListener("click", async () => {
+    startButton.disabled = true;
+    try {
+        const response = await fetch(startButton.dataset.url, {
+            method: "POST",
+            headers: {"X-CSRFToken": csrfToken},
+        });
+        showStatus(await response.json());
+    } catch (error) {
+        statusLine.textContent = "Не удалось запустить формирование архива";
+        startButton.disabled = false;
+    }
+});
+
+function showStatus(job) {
+    statusLine.textContent =
+        `${job.status_display}: ${job.cards_done} из ${job.cards_total}`;
+
+    if (job.download_url) {
+        const link = document.createElement("a");
+        link.href = job.download_url;
+        link.textContent = " Скачать архив";
+        statusLine.append(link);
+        startButton.disabled = false;
+    } else if (job.error) {
+        statusLine.textContent += ` (${job.error})`;
+        startButton.disabled = false;
+    } else {
+        setTimeout(() => poll(job.status_url), POLL_MS);
+    }
+}
+
+async function poll(url) {
+    try {
+        const response = await fetch(url);
+        showStatus(await response.json());
+    } catch (error) {
+        setTimeout(() => poll(url), POLL_MS * 5);
+    }
+}
@@ -0,0 +1,118 @@
+import hashlib
+from pathlib import Path
+import uuid
+
+from django.conf import settings
+
+from apps.core.files import write_file_atomic
+from apps.personal_cards.models import PersonalCard
+from apps.personal_cards.pdf import render_pdf, render_pdfs
+
+
+STORE_DIR = "personal_cards/pdf"
+# метка карточки, pdf которой сейчас верстается (см. _claim)
+PENDING_PREFIX = "pending-"
+
+
+def get_store_path(pdf_hash):
+    return Path(settings.MEDIA_ROOT) / STORE_DIR / pdf_hash[:2] / f"{pdf_hash}.pdf"
+
+
+def _get_stored_path(card):
+    """
+    Возвращает путь к сохраненному pdf карточки, если карточка
+    не менялась после верстки, иначе None
+    """
+    if card.pdf_hash:
+        path = get_store_path(card.pdf_hash)
+        if path.exists():
+            return path
+    return None
+
+
+def _hash_html(html_string):
+    # один и тот же html в разных профилях дает разные документы
+    content = f"{settings.PERSONAL_CARDS_PDF_PROFILE}\n{html_string}"
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def _claim(cards):
+    """
+    Отмечает карточки как верстающиеся и возвращает метку.
+    Сигналы сбрасывают любой непустой pdf_hash, в том числе метку,
+    поэтому _save узнает об изменении данных во время верстки
+    """
+    token = f"{PENDING_PREFIX}{uuid.uuid4().hex}"
+    PersonalCard.objects.filter(pk__in=[card.pk for card in cards]).update(pdf_hash=token)
+    for card in cards:
+        card.pdf_hash = token
+    return token
+
+
+def _save(card, pdf_hash, token, pdf=None):
+    """
+    Сохраняет pdf в хранилище (если он передан) и запоминает его хэш
+    в карточке, если данные карточки не менялись с момента _claim
+    """
+    if pdf is not None:
+        write_file_atomic(get_store_path(pdf_hash), lambda file: file.write(pdf))
+
+    updated = PersonalCard.objects.filter(
+        pk=card.pk, pdf_hash=token,
+    ).update(pdf_hash=pdf_hash)
+    card.pdf_hash = pdf_hash if updated else ""
+
+
+def get_card_pdf_path(constructor):
+    """
+    Возвращает путь к pdf карточки constructor.card.
+    Документ верстается, только если его содержимого еще нет в хранилище
+    """
+    card = constructor.card
+    path = _get_stored_path(card)
+    if path is not None:
+        return path
+
+    token = _claim([card])
+    html_string = constructor.get_html()
+    pdf_hash = _hash_html(html_string)
+    path = get_store_path(pdf_hash)
+    if path.exists():
+        _save(card, pdf_hash, token)
+    else:
+        _save(card, pdf_hash, token, render_pdf(html_string))
+    return path
+
+
+def get_cards_pdfs(constructors):
+    """
+    Генератор pdf карточек в порядке constructors. Неизмененные
+    карточки читаются из хранилища, остальные верстаются через render_pdfs
+    """
+    hashes = {}
+    changed = []
+    for index, constructor in enumerate(constructors):
+        if _get_stored_path(constructor.card) is not None:
+            hashes[index] = constructor.card.pdf_hash
+        else:
+            changed.append(index)
+
+    token = _claim([constructors[index].card for index in changed]) if changed else None
+    to_render = {}
+    for index in changed:
+        card = constructors[index].card
+        html_string = constructors[index].get_html()
+        hashes[index] = _hash_html(html_string)
+        if get_store_path(hashes[index]).exists():
+            _save(card, hashes[index], token)
+        else:
+            to_render[index] = html_string
+
+    rendered = render_pdfs(list(to_render.values()))
+    for index, constructor in enumerate(constructors):
+        if index in to_render:
+            pdf = next(rendered)
+            _save(constructor.card, hashes[index], token, pdf)
+            yield pdf
+        else:
+            yield get_store_path(hashes[index]).read_bytes()
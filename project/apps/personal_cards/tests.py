@@ -0,0 +1,222 @@
+import datetime
+import multiprocessing
+import os
+import time
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from apps.core.models import Campus, Group, Student, Subject
+from apps.personal_cards import models, pdf
+from apps.personal_cards.loaders import get_card_data_loader
+from apps.personal_cards.services import CardConstructor, archive_batch, create_batches
+from apps.tests_app.models import TaskSolution
+from apps.tests_management.models import Task, Test, TestAssign
+from apps.users.models import CustomUser
+
+
+# фрагменты карточки не кэшируются: проверяется полное формирование
+@override_settings(CACHES={
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "template_fragments": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+})
+class CardQueriesTest(TestCase):
+    """
+    Число запросов при формировании карточки не зависит
+    от количества предметов, тестов и навыков
+    """
+    CARD_PAGE_QUERIES = 9
+    PDF_CONTEXT_QUERIES = 8
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user("teacher", password="password")
+        campus = Campus.objects.create(name="Кампус")
+        cls.group = Group.objects.create(
+            campus=campus, studing_year=2, letter="А", year_created=2024,
+        )
+        cls.students = [
+            Student.objects.create(
+                surname=f"Фамилия {i}", name="Имя", patronomic="Отчество",
+                group=cls.group,
+            )
+            for i in range(3)
+        ]
+        create_batches(
+            [cls.group],
+            start_date=datetime.date(2025, 10, 1),
+            end_date=datetime.date(2025, 10, 31),
+        )
+        cls.card_id = models.PersonalCard.objects.order_by("id").first().id
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get_card(self):
+        return (
+            models.PersonalCard.objects
+            .select_related("batch", "student__group__campus")
+            .get(pk=self.card_id)
+        )
+
+    def add_data(self, count):
+        """
+        Добавляет count предметов с тестом, навыков и оценок навыков
+        """
+        card = self.get_card()
+        start = Subject.objects.count()
+        for number in range(start, start + count):
+            subject = Subject.objects.create(name=f"Предмет {number}")
+            test = Test.objects.create(
+                name=f"Тест {number}", subject=subject, studing_year=2,
+                month=10, is_published=True,
+            )
+            tasks = [
+                Task.objects.create(
+                    test=test, num=num, level=Task.BASIC,
+                    checked_skill=f"Тема {number}.{num}", max_points=3,
+                )
+                for num in (1, 2)
+            ]
+            TestAssign.objects.create(
+                test=test, group=self.group,
+                writing_date=datetime.date(2025, 10, 10),
+            )
+            for student in self.students:
+                for task in tasks:
+                    TaskSolution.objects.create(student=student, task=task, result=1)
+
+            skill = models.SoftSkill.objects.create(name=f"Навык {number}")
+            models.SoftSkillMark.objects.create(card=card, skill=skill, mark="Да")
+            models.PersonalRecommendations.objects.create(
+                card=card, subject=subject, text="Рекомендация",
+            )
+
+    def get_pdf_context(self, card):
+        # данные разделов вычисляются при обращении к ним
+        context = CardConstructor(card).get_pdf_context()
+        for key in ("tests", "repeat_topics", "softskills"):
+            context[key] = dict(context[key])
+        return context
+
+    def test_card_page_queries(self):
+        url = reverse("personal_cards:card", kwargs={"card_id": self.card_id})
+
+        self.add_data(2)
+        with self.assertNumQueries(self.CARD_PAGE_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        self.add_data(5)
+        with self.assertNumQueries(self.CARD_PAGE_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["softskills_formset"].forms), 7)
+
+    def test_pdf_context_queries(self):
+        card = self.get_card()
+        self.add_data(2)
+        with self.assertNumQueries(self.PDF_CONTEXT_QUERIES):
+            context = self.get_pdf_context(card)
+        self.assertEqual(len(context["tests"]), 2)
+
+        self.add_data(5)
+        card = self.get_card()
+        with self.assertNumQueries(self.PDF_CONTEXT_QUERIES):
+            context = self.get_pdf_context(card)
+        self.assertEqual(len(context["tests"]), 7)
+        self.assertEqual(len(context["softskills"]), 7)
+        self.assertEqual(
+            sum(len(results) for results in context["tests"].values()), 7
+        )
+
+
+
+class SoftSkillsMarksTest(TestCase):
+    """
+    В карточку попадают оценки навыков только из ее папки
+    и более ранних папок ученика
+    """
+    @classmethod
+    def setUpTestData(cls):
+        campus = Campus.objects.create(name="Кампус")
+        group = Group.objects.create(
+            campus=campus, studing_year=2, letter="А", year_created=2024,
+        )
+        cls.student = Student.objects.create(
+            surname="Фамилия", name="Имя", patronomic="Отчество", group=group,
+        )
+        cls.skill = models.SoftSkill.objects.create(name="Навык")
+        for month in (9, 10):
+            create_batches(
+                [group],
+                start_date=datetime.date(2025, month, 1),
+                end_date=datetime.date(2025, month, 28),
+            )
+        cls.old_card, cls.new_card = (
+            models.PersonalCard.objects
+            .select_related("batch", "student__group__campus")
+            .order_by("batch__start_date")
+        )
+        models.SoftSkillMark.objects.create(
+            card=cls.old_card, skill=cls.skill, mark="Да",
+        )
+
+    def get_marks(self, card):
+        marks = CardConstructor(card).get_softskills_marks()[self.skill]
+        return [mark.mark for mark in marks]
+
+    def test_later_marks_do_not_change_older_card(self):
+        self.assertEqual(self.get_marks(self.old_card), ["Да"])
+
+        models.SoftSkillMark.objects.create(
+            card=self.new_card, skill=self.skill, mark="Нет",
+        )
+        self.assertEqual(self.get_marks(self.old_card), ["Да"])
+        self.assertEqual(self.get_marks(self.new_card), ["Нет", "Да"])
+
+    def test_archived_older_card_keeps_its_marks(self):
+        models.SoftSkillMark.objects.create(
+            card=self.new_card, skill=self.skill, mark="Нет",
+        )
+        archive_batch(self.old_card.batch)
+
+        card = models.PersonalCard.objects.select_related("batch").get(
+            pk=self.old_card.pk,
+        )
+        context = get_card_data_loader(card.batch, [card]).get_pdf_context(card)
+        self.assertEqual(
+            {
+                skill.name: [mark.mark for mark in marks]
+                for skill, marks in context["softskills"].items()
+            },
+            {self.skill.name: ["Да"]},
+        )
+
+
+@override_settings(PERSONAL_CARDS_PDF_WORKERS=1)
+class TerminatePoolTest(SimpleTestCase):
+    """
+    terminate_pool завершает процессы, занятые версткой:
+    shutdown выполняющиеся задачи не прерывает
+    """
+    def test_busy_worker_is_terminated(self):
+        pool = pdf.get_pool()
+        worker_pid = pool.submit(os.getpid).result(timeout=30)
+        busy = pool.submit(time.sleep, 60)
+        while not busy.running():
+            time.sleep(0.01)
+
+        pdf.terminate_pool(pool)
+
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and worker_pid in {
+            process.pid for process in multiprocessing.active_children()
+        }:
+            time.sleep(0.05)
+        self.assertNotIn(
+            worker_pid,
+            {process.pid for process in multiprocessing.active_children()},
+        )
+        self.assertIsNot(pdf.get_pool(), pool)
+        pdf.terminate_pool(pdf.get_pool())
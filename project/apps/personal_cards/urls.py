@@ -17,6 +17,21 @@ urlpatterns = [
         views.DeleteBatchView.as_view(),
         name="delete_batch"
     ),
+    path(
+        "batches/<int:pk>/archive/",
+        views.ArchiveBatchView.as_view(),
+        name="archive_batch"
+    ),
+    path(
+        "batches/<int:pk>/unarchive/",
+        views.UnarchiveBatchView.as_view(),
+        name="unarchive_batch"
+    ),
+    path(
+        "groups/create_cards/",
+        views.CreateBatchesView.as_view(),
+        name="create_batches"
+    ),
     path(
         "groups/<int:pk>/create_cards/",
         views.CreateBatchWithCardsView.as_view(),
@@ -26,11 +41,38 @@ urlpatterns = [
         "batches/<int:pk>/pdf/", views.DownloadBatchCards.as_view(),
         name="download_batch_cards",
     ),
+    path(
+        "batches/<int:pk>/single_pdf/", views.DownloadBatchPdfView.as_view(),
+        name="download_batch_pdf",
+    ),
+    # фоновое формирование архива
+    path(
+        "batches/<int:pk>/jobs/", views.StartCardsJobView.as_view(),
+        name="start_cards_job",
+    ),
+    path(
+        "jobs/<int:pk>/", views.CardsJobStatusView.as_view(),
+        name="cards_job",
+    ),
+    path(
+        "jobs/<int:pk>/download/", views.DownloadCardsJobView.as_view(),
+        name="download_cards_job",
+    ),
     # действия с карточкой
     path(
         "cards/<int:card_id>/", views.CardView.as_view(),
         name="card",
     ),
+    path(
+        "cards/<int:card_id>/sections/<str:section>/",
+        views.CardSectionView.as_view(),
+        name="card_section",
+    ),
+    path(
+        "cards/<int:card_id>/sections/<str:section>/<int:key_id>/",
+        views.SaveCardRowView.as_view(),
+        name="save_card_row",
+    ),
     path(
         "cards/<int:pk>/pdf/", views.DownloadCardView.as_view(),
         name="download_card",
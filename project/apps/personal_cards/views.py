@@ -1,24 +1,33 @@
-import datetime
-import io
 from urllib.parse import quote
-import zipfile
 
-from django.conf import settings
 from django.contrib import messages
-from django.db import transaction
-from django.http import HttpResponse
+from django.forms import modelform_factory
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import render, redirect, get_object_or_404
-from django.template.loader import render_to_string
 from django.views import generic
-from django.urls import reverse_lazy
-from django.db.models import F
-from weasyprint import HTML
+from django.urls import reverse, reverse_lazy
 
-from apps.core.models import Subject, Group
-from apps.tests_app.models import TaskSolution, ResultsCalculator
-from apps.tests_management.models import Task, Test
+from apps.core.models import Group
 import apps.personal_cards.forms as forms
 import apps.personal_cards.models as models
+from apps.personal_cards.archives import stream_zip
+from apps.personal_cards.pdf import render_pdf
+from apps.personal_cards.services import (
+    CardConstructorMixin,
+    archive_batch,
+    create_batches,
+    get_batch_constructors,
+    get_batch_html,
+    unarchive_batch,
+)
+from apps.personal_cards.store import get_card_pdf_path, get_cards_pdfs
 from apps.core.views import ListFiltersMixin
 
 
@@ -28,6 +37,11 @@ class GroupsListView(ListFiltersMixin, generic.ListView):
     context_object_name = "groups"
     filter_fields = ["campus"]
     
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["create_batches_form"] = forms.CreateBatchesForm()
+        return context
+    
 
 class GroupBatchesListView(generic.ListView):
     model = models.CardsBatch
@@ -53,66 +67,25 @@ class BatchView(generic.DetailView):
     model = models.CardsBatch
     template_name = "personal_cards/batch.html"
     context_object_name = "batch"
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["cards"] = self.object.cards.select_related("student")
+        context["archive_batch_form"] = forms.ArchiveBatchForm()
+        return context
 
 
 class CreateBatchWithCardsView(generic.View):
-    subjects = Subject.objects.all()
-    softskills = models.SoftSkill.objects.all()
-
-    @staticmethod
-    def create_cards(batch):
-        return [
-            models.PersonalCard.objects.create(
-                batch=batch,
-                student=student,
-            )
-            for student in batch.group.students.all()
-        ]
-        
-    def create_recommendations(self, cards):
-        recs = [
-            models.PersonalRecommendations(card=card, subject=subject)
-            for subject in self.subjects
-            for card in cards
-        ]
-        models.PersonalRecommendations.objects.bulk_create(recs)
-        
-    def create_strengths(self, cards):
-        strengths = [
-            models.PersonalStrength(card=card, subject=subject)
-            for subject in self.subjects
-            for card in cards
-        ]
-        models.PersonalStrength.objects.bulk_create(strengths)
-        
-    def create_softskills_marks(self, cards):
-        marks = [
-            models.SoftSkillMark(card=card, skill=skill)
-            for card in cards
-            for skill in self.softskills
-        ]
-        models.SoftSkillMark.objects.bulk_create(marks)
-            
     def post(self, request, pk):
         group = get_object_or_404(Group, pk=pk)
         form = forms.CreateBatchForm(data=request.POST)
 
         if form.is_valid():
-            with transaction.atomic():
-                # создание карточек
-                batch = models.CardsBatch.objects.create(
-                    group=group, 
-                    start_date=form.cleaned_data["start_date"],
-                    end_date=form.cleaned_data["end_date"],
-                )
-                
-                cards = self.create_cards(batch=batch)
-                
-                # создание связанных объектов
-                self.create_recommendations(cards)
-                self.create_strengths(cards)
-                self.create_softskills_marks(cards)
-                
+            create_batches(
+                [group],
+                start_date=form.cleaned_data["start_date"],
+                end_date=form.cleaned_data["end_date"],
+            )
             messages.success(request, "Карточки успешно созданы!")
             
         else:
@@ -122,6 +95,36 @@ class CreateBatchWithCardsView(generic.View):
         return redirect(reverse_lazy("personal_cards:group", args=[group.id]))
 
 
+class CreateBatchesView(generic.View):
+    """
+    Создает папки карточек для всех действующих классов
+    (или для классов выбранного кампуса)
+    """
+    def post(self, request):
+        form = forms.CreateBatchesForm(data=request.POST)
+
+        if form.is_valid():
+            groups = Group.objects.filter(is_active=True)
+            if form.cleaned_data["campus"]:
+                groups = groups.filter(campus=form.cleaned_data["campus"])
+            
+            counts = create_batches(
+                groups,
+                start_date=form.cleaned_data["start_date"],
+                end_date=form.cleaned_data["end_date"],
+            )
+            messages.success(
+                request,
+                f"Создано папок: {counts['batches']}, "
+                f"карточек: {counts['cards']} "
+                f"за {counts['seconds']:.1f} с",
+            )
+        else:
+            messages.error(request, f"Ошибки при заполнении формы: {form.errors}")
+        
+        return redirect(reverse_lazy("personal_cards:groups_list"))
+
+
 class DeleteBatchView(generic.View):
     def post(self, request, pk):
         batch = get_object_or_404(models.CardsBatch, pk=pk)
@@ -131,238 +134,364 @@ class DeleteBatchView(generic.View):
         return redirect(success_url)
 
 
-class CardConstructorMixin:
+class ArchiveBatchView(generic.View):
     """
-    Предоставляет методы для формирования личных карточек.
-    Предполагает наличие атрибута self.card
+    Архивирует папку: карточки замораживаются в снимки
+    и дальше не зависят от текущих данных
     """
-
-    def _get_written_tests(self):
-        """
-        Возвращает тесты, написанные от 1 сентября текущего года
-        до конца отчетного периода отчёта
-        """
+    def post(self, request, pk):
+        batch = get_object_or_404(models.CardsBatch, pk=pk)
+        form = forms.ArchiveBatchForm(data=request.POST)
         
-        card_month = self.card.batch.start_date.month
-        card_year = self.card.batch.start_date.year
-        studing_year_started = datetime.date(
-            card_year if card_month in (9, 10, 11, 12) else card_year - 1,
-            9, 1,
-        )
-        return Test.objects.filter(
-            testassign__writing_date__gte=studing_year_started,
-            testassign__writing_date__lte=self.card.batch.end_date,
-            testassign__group=self.card.student.group
-        ).order_by("testassign__writing_date")
+        if form.is_valid():
+            count = archive_batch(batch, move_rows=form.cleaned_data["move_rows"])
+            messages.success(request, f"Папка перенесена в архив, карточек: {count}")
+        else:
+            messages.error(request, f"Ошибки при заполнении формы: {form.errors}")
+        
+        return redirect(reverse_lazy("personal_cards:batch", args=[batch.id]))
 
-    def get_repeat_topics(self):
-        """
-        Возвращает темы заданий базового уровня с ошибками 
-        (не максимальный балл) из тестов, написанных в отчётный период
-        """      
+
+class UnarchiveBatchView(generic.View):
+    def post(self, request, pk):
+        batch = get_object_or_404(models.CardsBatch, pk=pk)
         
-        solutions_with_mistakes = TaskSolution.objects.filter(
-            task__test__in=self._get_written_tests(),
-            student=self.card.student,
-            task__level=Task.BASIC,
-            result__lt=F('task__max_points')
-        )
+        unarchive_batch(batch)
+        messages.success(request, "Папка возвращена из архива")
+        return redirect(reverse_lazy("personal_cards:batch", args=[batch.id]))
 
-        topics = {}
-        for subject in Subject.objects.all():
-            topics[subject] = set(
-                solutions_with_mistakes
-                .filter(task__test__subject=subject)
-                .values_list("task__checked_skill", flat=True)
-            )
-            
-        return topics        
 
-    def get_tests_results(self):
-        tests_by_subjects = {subject: [] for subject in Subject.objects.all()}
+class CardObjectMixin(CardConstructorMixin):
+    """
+    Загружает карточку из card_id в self.card вместе с папкой
+    и учеником, которые нужны всем разделам карточки,
+    и предоставляет формсеты разделов
+    """
 
-        for test in self._get_written_tests():
-            calculator = ResultsCalculator(test, self.card.student)
-            
-            result = {"test": test, "basic_percent": "-", "reflexive_percent": "-"}
-            
-            if not calculator.empty_result:
-                result["basic_percent"] = calculator.get_total_percent(Task.BASIC)
-                if test.with_reflexive_level:
-                    result["reflexive_percent"] = calculator.get_total_percent(Task.REFLEXIVE)
-
-            tests_by_subjects[test.subject].append(result)
-
-        return tests_by_subjects
-
-    def get_softskills_marks(self):
-        marks_by_skill = {skill: [] for skill in models.SoftSkill.objects.all()}
-        marks = (
-            models.SoftSkillMark.objects
-            .filter(card__student=self.card.student)
-            .exclude(mark__isnull=True)
-            .order_by("-card__batch__start_date")[:3]
+    def dispatch(self, request, *args, **kwargs):
+        self.card = get_object_or_404(
+            models.PersonalCard.objects.select_related("batch", "student__group__campus"),
+            id=kwargs["card_id"],
         )
+        return super().dispatch(request, *args, **kwargs)
 
-        for mark in marks:
-            marks_by_skill[mark.skill].append(mark)
-        
-        return marks_by_skill
-
-    def get_recommendations(self):
-        return {
-            rec.subject.name: rec.text for rec in 
-            models.PersonalRecommendations.objects.filter(card=self.card)
-        }
-    
-    def get_strengths(self):
-        return {
-            s.subject.name: s.text for s in 
-            models.PersonalStrength.objects.filter(card=self.card)
-        }
-    
     def get_recommendations_formset(self, post_data=None):
-        return forms.RecommendationsFormset(post_data, instance=self.card)
+        return forms.RecommendationsFormset(
+            post_data,
+            instance=self.card,
+            queryset=models.PersonalRecommendations.objects.select_related("subject"),
+            keys=self.loader.subjects,
+        )
         
     def get_strengths_formset(self, post_data=None):
-        return forms.StrengthsFormset(post_data, instance=self.card)
+        return forms.StrengthsFormset(
+            post_data,
+            instance=self.card,
+            queryset=models.PersonalStrength.objects.select_related("subject"),
+            keys=self.loader.subjects,
+        )
         
     def get_softskills_formset(self, post_data=None):
-        return forms.SofskillsFormset(post_data, instance=self.card)
+        return forms.SofskillsFormset(
+            post_data,
+            instance=self.card,
+            queryset=models.SoftSkillMark.objects.select_related("skill"),
+            keys=self.loader.softskills,
+        )
     
     def get_view_context(self):
         """
         Возвращает контекст для использования в CardView:
         неизменяемые данные представлены в виде словарей,
-        изменяемые - в виде форм
+        изменяемые - в виде форм. Результаты проверочных и темы
+        для повторения сюда не входят, их отдает CardSectionView
         """
         return {
             "card": self.card,
-            "tests": self.get_tests_results(),
-            "repeat_topics": self.get_repeat_topics(),
-            "softskills": self.get_softskills_marks(),
+            "fragments": self.get_fragments(),
+            "softskills": self.loader.lazy(
+                self.loader.get_softskills_marks, self.card
+            ),
             "recommendations_formset": self.get_recommendations_formset(),
             "strengths_formset": self.get_strengths_formset(),
             "softskills_formset": self.get_softskills_formset()
         }
-    
-    def get_pdf_context(self):
-        """
-        Возвращает контекст для формирования pdf-документа
-        """
-        return {
-            "card": self.card,
-            "tests": self.get_tests_results(),
-            "repeat_topics": self.get_repeat_topics(),
-            "softskills": self.get_softskills_marks(),
-            "recommendations": self.get_recommendations(),
-            "strengths": self.get_strengths(),
-        }
-        
-    def get_pdf(self):
-        """
-        Возвращает pdf-документ в виде последовательности байтов
-        """
-        html_string = render_to_string(
-            template_name="personal_cards/personal_card_pdf.html",
-            context=self.get_pdf_context(),
-        )
-        html = HTML(
-            string=html_string,
-            base_url=settings.BASE_DIR,
-        )
-        return html.write_pdf()
-        
-    def get_filename(self):
-        return (
-            f"{self.card.student.surname} {self.card.student.name} "
-            f"от {self.card.batch.start_date}.pdf"
-        )
-    
-    def get_pdf_filename(self):
-        return quote(self.get_filename())
-        
 
-class CardConstructor(CardConstructorMixin):
+
+class CardView(CardObjectMixin, generic.View):
     """
-    Самостоятельный класс для отображения карточки
+    Страница редактирования карточки. Результаты проверочных и темы
+    для повторения подгружаются отдельными запросами к CardSectionView,
+    каждая форма сохраняется отдельно. Карточка архивной папки
+    только отображается по снимку
     """
-    def __init__(self, card):
-        self.card = card
-        
-
-class CardView(generic.View, CardConstructorMixin):
     template_name = "personal_card.html"
-    
-    def dispatch(self, request, *args, **kwargs):
-        self.card=models.PersonalCard.objects.get(id=kwargs["card_id"])
-        return super().dispatch(request, *args, **kwargs)
         
     def get(self, request, card_id):
+        if self.card.batch.is_archived:
+            return render(
+                request,
+                "personal_cards/archived_card.html",
+                self.get_pdf_context(),
+            )
+        
         return render(
             request,
             "personal_cards/personal_card.html",
             self.get_view_context(),
         )
 
-    def post(self, request, card_id):
-        recommendations_formset = self.get_recommendations_formset(request.POST)
-        strengths_formset = self.get_strengths_formset(request.POST)
-        softskills_formset = self.get_softskills_formset(request.POST)
+
+class CardSectionView(CardObjectMixin, generic.View):
+    """
+    Один раздел карточки: GET возвращает html-фрагмент раздела,
+    POST сохраняет только формсет этого раздела.
+    Разделы архивной карточки не отдаются и не изменяются
+    """
+    READONLY_SECTIONS = {
+        "tests_results": "personal_cards/card_parts/tests_results.html",
+        "repeat_topics": "personal_cards/card_parts/repeat_topics.html",
+    }
+    FORM_SECTIONS = ["softskills", "recommendations", "strengths"]
+
+    def dispatch(self, request, *args, **kwargs):
+        self.section = kwargs["section"]
+        if (
+            self.section not in self.READONLY_SECTIONS
+            and self.section not in self.FORM_SECTIONS
+        ):
+            raise Http404("Раздел карточки не найден")
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_formset(self, post_data=None):
+        return getattr(self, f"get_{self.section}_formset")(post_data)
+
+    def get(self, request, card_id, section):
+        if self.card.batch.is_archived:
+            raise Http404("Карточка в архиве")
         
-        if recommendations_formset.is_valid():
-            recommendations_formset.save()
+        if section == "tests_results":
+            template_name = self.READONLY_SECTIONS[section]
+            context = {"tests": self.loader.lazy(
+                self.loader.get_tests_results, self.card
+            )}
+        elif section == "repeat_topics":
+            template_name = self.READONLY_SECTIONS[section]
+            context = {"repeat_topics": self.loader.lazy(
+                self.loader.get_repeat_topics, self.card
+            )}
+        else:
+            template_name = f"personal_cards/card_sections/{section}_form.html"
+            context = {f"{section}_formset": self.get_formset()}
         
-        if strengths_formset.is_valid():
-            strengths_formset.save()
-            
-        if softskills_formset.is_valid():
-            softskills_formset.save()
-            
+        context["card"] = self.card
+        context["fragments"] = self.get_fragments()
+        return render(request, template_name, context)
+
+    def post(self, request, card_id, section):
+        if section not in self.FORM_SECTIONS:
+            return HttpResponse(status=405)
+        
+        if self.card.batch.is_archived:
+            messages.error(request, "Папка в архиве, карточку нельзя изменить")
+            return redirect(reverse_lazy(
+                "personal_cards:card", kwargs={"card_id": card_id}
+            ))
+
+        formset = self.get_formset(request.POST)
+        if not formset.is_valid():
+            context = self.get_view_context()
+            context[f"{section}_formset"] = formset
+            return render(
+                request,
+                "personal_cards/personal_card.html",
+                context,
+                status=400,
+            )
+        
+        formset.save()
         return redirect(reverse_lazy(
             "personal_cards:card", kwargs={"card_id": card_id}
         ))
 
 
+class SaveCardRowView(CardObjectMixin, generic.View):
+    """
+    Сохраняет одно поле карточки (рекомендацию, сильную сторону
+    или оценку навыка) для предмета или навыка key_id.
+    Затрагивается только строка этого предмета (навыка)
+    """
+    ROW_MODELS = {
+        "recommendations": (models.PersonalRecommendations, "subject", "text"),
+        "strengths": (models.PersonalStrength, "subject", "text"),
+        "softskills": (models.SoftSkillMark, "skill", "mark"),
+    }
+
+    def post(self, request, card_id, section, key_id):
+        if section not in self.ROW_MODELS:
+            raise Http404("Раздел карточки не найден")
+        if self.card.batch.is_archived:
+            return JsonResponse(
+                {"errors": {"__all__": ["Папка в архиве, карточку нельзя изменить"]}},
+                status=409,
+            )
+        model, key_field, value_field = self.ROW_MODELS[section]
+        
+        row = model.objects.filter(
+            card=self.card, **{f"{key_field}_id": key_id}
+        ).first()
+        created = row is None
+        if created:
+            key_model = model._meta.get_field(key_field).related_model
+            row = model(
+                card=self.card,
+                **{key_field: get_object_or_404(key_model, pk=key_id)},
+            )
+        
+        form = modelform_factory(model, fields=[value_field])(
+            request.POST, instance=row
+        )
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        
+        # пустое значение для еще не созданной строки не сохраняется
+        if created and not form.cleaned_data[value_field]:
+            return JsonResponse({"saved": False, "created": False})
+        
+        row = form.save()
+        return JsonResponse({"saved": True, "created": created, "id": row.pk})
+
+
 class DownloadCardView(generic.View, CardConstructorMixin):
     """
-    Возвращает HttpResponse с pdf-файлом и соответствующими заголовками
+    Возвращает pdf-файл карточки из хранилища сформированных документов.
+    Документ верстается заново, только если данные карточки изменились
     """
 
     template_name = "personal_cards/personal_card_pdf.html"
     
     def get(self, request, *args, **kwargs):
-        self.card = get_object_or_404(models.PersonalCard, pk=self.kwargs["pk"])
+        self.card = get_object_or_404(
+            models.PersonalCard.objects.select_related("batch", "student__group__campus"),
+            pk=self.kwargs["pk"],
+        )
         
-        return HttpResponse(
-            content=self.get_pdf(),
-            content_type='application/pdf',
-            headers={
-                "Content-Disposition": f"attachment; filename={self.get_pdf_filename()}"
-            }
+        path = get_card_pdf_path(self)
+        # имя файла в хранилище - хэш его содержимого
+        etag = f'"{path.stem}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in request.headers.get("If-None-Match", ""):
+            return HttpResponseNotModified(headers=headers)
+        
+        response = FileResponse(
+            open(path, "rb"),
+            as_attachment=True,
+            filename=self.get_filename(),
+            content_type="application/pdf",
         )
+        for header, value in headers.items():
+            response[header] = value
+        return response
 
 
 class DownloadBatchCards(generic.View):
     def get(self, request, pk):
         batch = get_object_or_404(models.CardsBatch, pk=pk)
         
-        buffer = io.BytesIO()
-        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip:
-            for card in batch.cards.all():
-                constructor = CardConstructor(card)
-                zip.writestr(
-                    constructor.get_filename(),
-                    constructor.get_pdf(),
-                )
+        # данные карточек собираются здесь, верстка идет параллельно
+        constructors = get_batch_constructors(batch)
+        entries = (
+            (constructor.get_filename(), pdf)
+            for constructor, pdf in zip(constructors, get_cards_pdfs(constructors))
+        )
         
         filename = f"{batch.group} за {batch.start_date}.zip"
-        buffer.seek(0)
-        return HttpResponse(
-            content=buffer.getvalue(),
+        return StreamingHttpResponse(
+            streaming_content=stream_zip(entries),
             content_type='application/zip',
             headers={
                 "Content-Disposition": f"attachment; filename={quote(filename)}"
             }
-        )    
-            
\ No newline at end of file
+        )
+
+
+class DownloadBatchPdfView(generic.View):
+    """
+    Возвращает все карточки папки одним pdf-документом для печати.
+    Разметка всех карточек верстается за один проход
+    """
+    def get(self, request, pk):
+        batch = get_object_or_404(models.CardsBatch.objects.select_related("group"), pk=pk)
+        constructors = get_batch_constructors(batch)
+        
+        filename = f"{batch.group} за {batch.start_date}.pdf"
+        return HttpResponse(
+            content=render_pdf(get_batch_html(constructors)),
+            content_type="application/pdf",
+            headers={
+                "Content-Disposition": f"attachment; filename={quote(filename)}"
+            }
+        )
+
+
+class StartCardsJobView(generic.View):
+    """
+    Ставит в очередь фоновое формирование архива карточек папки.
+    Если для папки уже есть задача в работе, возвращает ее,
+    а задача с ошибкой перезапускается с места остановки.
+    Новая задача заменяет готовые задачи папки вместе с их архивами
+    """
+    def post(self, request, pk):
+        batch = get_object_or_404(models.CardsBatch, pk=pk)
+        job = batch.render_jobs.order_by("-created_at").first()
+        
+        if job is not None and job.status == models.CardsRenderJob.FAILED:
+            job.status = models.CardsRenderJob.QUEUED
+            job.error = ""
+            job.save(update_fields=["status", "error", "updated_at"])
+        elif job is None or not job.is_active:
+            batch.render_jobs.filter(status=models.CardsRenderJob.DONE).delete()
+            job = models.CardsRenderJob.objects.create(batch=batch)
+        
+        return JsonResponse(get_job_status(job), status=202)
+
+
+class CardsJobStatusView(generic.View):
+    def get(self, request, pk):
+        job = get_object_or_404(models.CardsRenderJob, pk=pk)
+        return JsonResponse(get_job_status(job))
+
+
+class DownloadCardsJobView(generic.View):
+    def get(self, request, pk):
+        job = get_object_or_404(
+            models.CardsRenderJob.objects.select_related("batch__group"), pk=pk,
+        )
+        if job.status != models.CardsRenderJob.DONE:
+            raise Http404("Архив еще не сформирован")
+        
+        batch = job.batch
+        return FileResponse(
+            job.archive.open("rb"),
+            as_attachment=True,
+            filename=f"{batch.group} за {batch.start_date}.zip",
+        )
+
+
+def get_job_status(job):
+    """
+    Возвращает состояние фоновой задачи для опроса со страницы папки
+    """
+    return {
+        "id": job.id,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "cards_done": job.cards_done,
+        "cards_total": job.cards_total,
+        "error": job.error,
+        "status_url": reverse("personal_cards:cards_job", args=[job.id]),
+        "download_url": (
+            reverse("personal_cards:download_cards_job", args=[job.id])
+            if job.status == models.CardsRenderJob.DONE else None
+        ),
+    }
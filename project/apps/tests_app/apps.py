@@ -5,3 +5,6 @@ class TestsAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.tests_app"
     verbose_name = "Выставление и просмотр оценок за проверочные"
+
+    def ready(self):
+        import apps.tests_app.signals  # noqa: F401
@@ -1,7 +1,10 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.functional import cached_property
 
 import apps.tests_app.models as models
+from apps.tests_app.signals import solutions_changed
 from apps.tests_management.models import Task, TestAssign
 
 
@@ -14,116 +17,325 @@ class TestAssignForm(forms.ModelForm):
         }
 
 
-class TaskSolutionForm(forms.ModelForm):
-    class Meta:
-        model = models.TaskSolution
-        fields = ["student", "task", "result"]
-        widgets = {
-            "student": forms.HiddenInput,
-            "task": forms.HiddenInput,
-            "result": forms.NumberInput
-        }
-        
-    def __init__(self, *args, **kwargs):
+def check_result_range(result, task):
+    """
+    Проверяет, что результат находится в диапазоне допустимых значений
+    """
+    if result and not 0 <= result <= task.max_points:
+        raise ValidationError(
+            f"Значение должно быть в диапазоне [0, {task.max_points}]"
+        )
+
+
+class TaskPairs:
+    """
+    Индекс заданий теста: номер задания -> задания базового и
+    рефлексивного уровней (с max_points). Строится один раз на запрос
+    таблицы (MarksGridForm) или автосохранения (MarksCellsUpdate),
+    поэтому проверка согласованности уровней сводится к поиску по словарю
+    """
+    def __init__(self, tasks):
+        self.pairs = {}
+        for task in tasks:
+            self.pairs.setdefault(task.num, {})[task.level] = task
+
+    @classmethod
+    def for_test(cls, test):
+        return cls(Task.objects.filter(test=test))
+
+    def check_levels_are_consistent(self, new_results, skip_unset_basic=False):
+        """
+        Проверяет, что баллы за задания базового и рефлексивного уровней
+        находятся в согласованном состоянии. (Согласно системе оценивания,
+        если ученик решил рефлексивное задание, соответствующее задание
+        базового уровня защитывается на максимальный балл автоматически).
+        new_results - словарь вида задание: результат; пары, которых
+        нет в new_results или где рефлексивный балл не выставлен, пропускаются.
+        skip_unset_basic - пропускать и пары, где не выставлен базовый балл
+        (при автосохранении ячейки заполняются в любом порядке)
+        """
+        for num, levels in self.pairs.items():
+            basic_task = levels.get(Task.BASIC)
+            reflexive_task = levels.get(Task.REFLEXIVE)
+            if basic_task is None or reflexive_task is None:
+                continue
+
+            reflexive_result = new_results.get(reflexive_task)
+            if reflexive_result is None or basic_task not in new_results:
+                continue
+            if skip_unset_basic and new_results[basic_task] is None:
+                continue
+
+            basic_task_has_max_points = (
+                new_results[basic_task] == basic_task.max_points
+            )
+            if reflexive_result > 0 and not basic_task_has_max_points:
+                raise ValidationError(
+                    f"В задании #{num} базовый уровень должен быть оценен "
+                    "на максимум, так как решён рефлексивный"
+                )
+
+
+class MarksGridForm(forms.Form):
+    """
+    Форма для выставления баллов всему классу за один тест.
+    Каждому TaskSolution соответствует поле result-<id>.
+    Все ячейки валидируются в памяти, сохраняются
+    только изменившиеся - одним upsert-запросом
+    """
+    def __init__(self, test, students, tasks, solutions, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # ограничивает возможные значения поля result
-        self.fields["result"].widget.attrs["min"] = 0
-        self.fields["result"].widget.attrs["max"] = self.instance.task.max_points
+        self.test = test
+        self.students = list(students)
+        self.tasks = list(tasks)
+        self.task_pairs = TaskPairs(self.tasks)
+        self.solutions = {
+            (solution.student_id, solution.task_id): solution
+            for solution in solutions
+        }
 
-    def clean(self):
-        cleaned_data = super().clean()
-        
-        # поле result находится в диапазоне допустимых значений
-        if (
-            cleaned_data["result"] and not 
-            0 <= cleaned_data["result"] <= self.instance.task.max_points
-        ):
-            raise ValidationError(
-                "Значение должно быть в диапазоне [0, "
-                f"{self.instance.task.max_points}]"
+        for solution in self.solutions.values():
+            self.fields[self.get_field_name(solution)] = forms.IntegerField(
+                required=False,
+                initial=solution.result,
+                widget=forms.NumberInput(
+                    attrs={
+                        "min": 0,
+                        "max": solution.task.max_points,
+                        # используются автосохранением ячеек
+                        "data-student": solution.student_id,
+                        "data-task": solution.task_id,
+                    }
+                ),
             )
-        
-        return cleaned_data
-        
 
-class BaseStudentTestSolutionFormset(forms.BaseModelFormSet):
-    def clean(self):
+    @staticmethod
+    def get_field_name(solution):
+        return f"result-{solution.id}"
+
+    def get_student_solutions(self, student):
+        return [
+            self.solutions[(student.id, task.id)] for task in self.tasks
+            if (student.id, task.id) in self.solutions
+        ]
+
+    @property
+    def rows(self):
         """
-        выполнят дополнительную проверку: 
-        или должны быть заполнены все поля, 
-        или все должны быть пустыми (когда ученик не писал тест)
+        Строки таблицы: ученик и поля в порядке заданий
+        (None, если у ученика нет решения задания)
         """
+        for student in self.students:
+            cells = []
+            for task in self.tasks:
+                solution = self.solutions.get((student.id, task.id))
+                cells.append(
+                    self[self.get_field_name(solution)] if solution else None
+                )
+            yield student, cells
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        for solution in self.solutions.values():
+            name = self.get_field_name(solution)
+            if name not in cleaned_data:
+                continue
+            try:
+                check_result_range(cleaned_data[name], solution.task)
+            except ValidationError as error:
+                self.add_error(name, error)
+
         if any(self.errors):
-            return
-        if not len(self.forms) > 0:
-            return
-        
-        self.test = self.get_test()
-        new_results = self.get_new_results()
-        
-        self.check_filled_in_full(new_results)
-        if self.is_filled and self.test.with_reflexive_level:
-            self.check_levels_are_consistent(new_results)
-    
-    def get_test(self):
-        return self.forms[0].instance.task.test
-            
-    def get_new_results(self):
-        return {
-            form.instance.task: form.cleaned_data["result"] for form in self.forms
-        }
-    
-    def check_filled_in_full(self, new_results):
+            return cleaned_data
+
+        for student in self.students:
+            new_results = {
+                solution.task: cleaned_data[self.get_field_name(solution)]
+                for solution in self.get_student_solutions(student)
+            }
+            if not new_results:
+                continue
+            try:
+                is_filled = self.check_filled_in_full(new_results)
+                if is_filled and self.test.with_reflexive_level:
+                    self.task_pairs.check_levels_are_consistent(new_results)
+            except ValidationError as error:
+                self.add_error(
+                    None,
+                    f"Ошибка при заполнении '{student.surname} {student.name}': "
+                    f"{' '.join(error.messages)}"
+                )
+
+        return cleaned_data
+
+    @staticmethod
+    def check_filled_in_full(new_results):
         """
-        Проверяет, что результаты теста не были заполнены частично
+        Проверяет, что результаты теста не были заполнены частично.
+        Возвращает True, если заполнены все поля
         """
-        if not (
-            all(res is None for res in new_results.values()) or
-            all(res is not None for res in new_results.values())
-        ):
+        is_filled = all(res is not None for res in new_results.values())
+        if not (is_filled or all(res is None for res in new_results.values())):
             raise ValidationError(
                 "Если вы начали заполнять результаты ученика, "
                 "надо заполнить поля для ВСЕХ заданий"
             )
-            
-        self.is_filled = all(res is not None for res in new_results.values())
+        return is_filled
 
-    def check_levels_are_consistent(self, new_results):
+    @cached_property
+    def changed_solutions(self):
         """
-        Проверяет, что баллы за задания базового и рефлексивного уровней
-        находятся в согласованном состоянии. (Согласно системе оценивания,
-        если ученик решил рефлексивное задание, соответствующее задание
-        базового уровня защитывается на максимальный балл автоматически)
+        Записывает новые результаты в объекты и возвращает
+        только те решения, результат которых изменился.
+        Кэшируется, чтобы повторная попытка сохранения
+        записала те же изменения
         """
-        nums = self.queryset.values_list("task__num", flat=True).distinct()
-        
-        for num in nums:
-            basic_task = Task.objects.get(
-                test=self.test, num=num, level=Task.BASIC
+        changed = []
+        for solution in self.solutions.values():
+            result = self.cleaned_data[self.get_field_name(solution)]
+            if solution.result != result:
+                solution.result = result
+                changed.append(solution)
+        return changed
+
+    def save(self):
+        if self.changed_solutions:
+            models.TaskSolution.upsert_results(self.changed_solutions)
+            solutions_changed.send(
+                sender=models.TaskSolution,
+                test=self.test,
+                student_ids={s.student_id for s in self.changed_solutions},
+            )
+        return self.changed_solutions
+
+
+class MarksCellsUpdate:
+    """
+    Изменение отдельных ячеек таблицы оценок (автосохранение).
+    changes - список словарей {"student": id, "task": id, "result": число
+    или None}. Проверяет диапазон баллов и согласованность уровней только
+    для затронутых учеников; полнота заполнения не проверяется, так как
+    учитель заполняет строку постепенно (рефлексивный балл может быть
+    введен раньше базового)
+    """
+    def __init__(self, test, group, changes):
+        self.test = test
+        self.group = group
+        self.errors = {}
+        self.changes = self.parse_changes(changes)
+
+    def parse_changes(self, changes):
+        """
+        Приводит изменения к виду {(student_id, task_id): result}.
+        Вызывает ValueError, если данные имеют неверный формат;
+        нецелый балл считается ошибкой только этого ученика
+        """
+        if not isinstance(changes, list) or not changes:
+            raise ValueError("Ожидается непустой список изменений")
+
+        parsed = {}
+        for change in changes:
+            try:
+                student_id = change["student"]
+                task_id = change["task"]
+                result = change["result"]
+            except (TypeError, KeyError):
+                raise ValueError("Изменение должно содержать student, task и result")
+
+            if not all(
+                isinstance(value, int) and not isinstance(value, bool)
+                for value in (student_id, task_id)
+            ):
+                raise ValueError("student и task должны быть целыми числами")
+            if result is not None and (
+                not isinstance(result, int) or isinstance(result, bool)
+            ):
+                self.errors[student_id] = "Балл должен быть целым числом"
+
+            parsed[(student_id, task_id)] = result
+
+        return parsed
+
+    def is_valid(self):
+        task_pairs = TaskPairs.for_test(self.test)
+        tasks = {
+            task.id: task
+            for levels in task_pairs.pairs.values()
+            for task in levels.values()
+        }
+        student_ids = {student_id for student_id, _ in self.changes}
+        group_student_ids = set(
+            self.group.students
+            .filter(id__in=student_ids)
+            .values_list("id", flat=True)
+        )
+
+        self.solutions = {
+            (solution.student_id, solution.task_id): solution
+            for solution in models.TaskSolution.objects.filter(
+                student_id__in=group_student_ids, task__test=self.test,
             )
-            reflexive_task = Task.objects.get(
-                test=self.test, num=num, level=Task.REFLEXIVE
+        }
+
+        for student_id in student_ids:
+            if student_id in self.errors:
+                continue
+            if student_id not in group_student_ids:
+                self.errors[student_id] = "Ученик не относится к этому классу"
+                continue
+
+            new_results = {
+                tasks[task_id]: solution.result
+                for (solution_student_id, task_id), solution
+                in self.solutions.items()
+                if solution_student_id == student_id
+            }
+            try:
+                for (change_student_id, task_id), result in self.changes.items():
+                    if change_student_id != student_id:
+                        continue
+                    if task_id not in tasks:
+                        raise ValidationError("Задание не относится к этому тесту")
+                    check_result_range(result, tasks[task_id])
+                    new_results[tasks[task_id]] = result
+
+                if self.test.with_reflexive_level:
+                    task_pairs.check_levels_are_consistent(
+                        new_results, skip_unset_basic=True,
+                    )
+            except ValidationError as error:
+                self.errors[student_id] = " ".join(error.messages)
+
+        return not self.errors
+
+    @property
+    def valid_changes(self):
+        return {
+            key: result for key, result in self.changes.items()
+            if key[0] not in self.errors
+        }
+
+    def save(self):
+        """
+        Сохраняет изменения учеников без ошибок одним upsert-запросом:
+        существующие решения обновляются, недостающие создаются
+        """
+        solutions = [
+            models.TaskSolution(
+                student_id=student_id, task_id=task_id, result=result
             )
-            
-            basic_task_has_max_points = (
-                new_results[basic_task] == basic_task.max_points
+            for (student_id, task_id), result in self.valid_changes.items()
+        ]
+        if not solutions:
+            return solutions
+
+        with transaction.atomic():
+            models.TaskSolution.upsert_results(solutions)
+            solutions_changed.send(
+                sender=models.TaskSolution,
+                test=self.test,
+                student_ids={s.student_id for s in solutions},
             )
-            reflexive_task_has_points = new_results[reflexive_task] > 0
-            
-            if reflexive_task_has_points and (not basic_task_has_max_points):
-                raise ValidationError(
-                    f"""В задании #{num} базовый уровень должен
-                    быть оценен на максимум, так как
-                    решён рефлексивный"""
-                )
-  
-        
-"""
-Используется для выставления ответов одного студента на один тест
-"""
-StudentTestSolutionFormSet = forms.modelformset_factory(
-    models.TaskSolution,
-    TaskSolutionForm,
-    formset=BaseStudentTestSolutionFormset,
-    extra=0,
-)
+
+        return solutions
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.tests_app.models import TestResultSummary
+from apps.tests_management.models import Test
+
+
+class Command(BaseCommand):
+    help = "Пересобирает таблицу итогов тестов (TestResultSummary) по TaskSolution"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--test",
+            type=int,
+            action="append",
+            dest="test_ids",
+            help="id теста (можно указать несколько раз); по умолчанию все тесты",
+        )
+
+    def handle(self, *args, test_ids=None, **options):
+        tests = Test.objects.all()
+        if test_ids:
+            tests = tests.filter(id__in=test_ids)
+
+        total = 0
+        for test in tests.iterator():
+            with transaction.atomic():
+                total += len(TestResultSummary.objects.refresh(test))
+
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано итогов: {total}"))
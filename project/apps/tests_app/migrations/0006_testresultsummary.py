@@ -0,0 +1,90 @@
+# Generated by Django 4.2 on 2026-10-18 06:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_summaries(apps, schema_editor):
+    """
+    Заполняет итоги по уже выставленным баллам
+    """
+    Task = apps.get_model("tests_management", "Task")
+    TaskSolution = apps.get_model("tests_app", "TaskSolution")
+    TestResultSummary = apps.get_model("tests_app", "TestResultSummary")
+
+    max_points = {}
+    tasks_count = {}
+    for test_id, level, points in Task.objects.values_list("test_id", "level", "max_points"):
+        max_points[(test_id, level)] = max_points.get((test_id, level), 0) + points
+        tasks_count[test_id] = tasks_count.get(test_id, 0) + 1
+
+    def percent(test_id, points, level):
+        if points is None or not max_points.get((test_id, level)):
+            return None
+        return points / max_points[(test_id, level)] * 100
+
+    rows = (
+        TaskSolution.objects
+        .order_by()
+        .values("task__test", "student")
+        .annotate(
+            basic=models.Sum("result", filter=models.Q(task__level="Баз")),
+            reflexive=models.Sum("result", filter=models.Q(task__level="Реф")),
+            results_count=models.Count("result"),
+        )
+    )
+    TestResultSummary.objects.bulk_create(
+        [
+            TestResultSummary(
+                test_id=row["task__test"],
+                student_id=row["student"],
+                basic_points=row["basic"],
+                reflexive_points=row["reflexive"],
+                basic_percent=percent(row["task__test"], row["basic"], "Баз"),
+                reflexive_percent=percent(row["task__test"], row["reflexive"], "Реф"),
+                results_count=row["results_count"],
+                is_complete=row["results_count"] == tasks_count[row["task__test"]],
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests_management', '0014_alter_task_level_alter_task_max_points_and_more'),
+        ('core', '0002_alter_student_options_alter_subject_name'),
+        ('tests_app', '0005_alter_tasksolution_result'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestResultSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('basic_points', models.IntegerField(null=True, verbose_name='баллы (базовый уровень)')),
+                ('reflexive_points', models.IntegerField(null=True, verbose_name='баллы (рефлексивный уровень)')),
+                ('basic_percent', models.FloatField(null=True, verbose_name='процент (базовый уровень)')),
+                ('reflexive_percent', models.FloatField(null=True, verbose_name='процент (рефлексивный уровень)')),
+                ('results_count', models.SmallIntegerField(default=0, verbose_name='количество заданий с выставленным баллом')),
+                ('is_complete', models.BooleanField(default=False, verbose_name='выставлены ли баллы за все задания')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tests_results_summaries', to='core.student', verbose_name='ученик')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results_summaries', to='tests_management.test', verbose_name='тест')),
+            ],
+            options={
+                'verbose_name': 'итог теста',
+                'verbose_name_plural': 'итоги тестов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='testresultsummary',
+            index=models.Index(fields=['student', 'test'], name='tests_app_t_student_311a8e_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='testresultsummary',
+            constraint=models.UniqueConstraint(fields=('test', 'student'), name='unique_test_result_summary'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2 on 2026-10-18 06:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Оставляет одно решение на пару (ученик, задание):
+    с выставленным баллом, а среди них - последнее созданное
+    """
+    TaskSolution = apps.get_model("tests_app", "TaskSolution")
+
+    duplicates = (
+        TaskSolution.objects
+        .order_by()
+        .values("student", "task")
+        .annotate(count=models.Count("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        solutions = sorted(
+            TaskSolution.objects.filter(
+                student=duplicate["student"], task=duplicate["task"],
+            ),
+            key=lambda solution: (solution.result is not None, solution.id),
+        )
+        TaskSolution.objects.filter(
+            id__in=[solution.id for solution in solutions[:-1]]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests_management', '0015_test_totals'),
+        ('core', '0002_alter_student_options_alter_subject_name'),
+        ('tests_app', '0006_testresultsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tasksolution',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tasks_solutions', to='core.student', verbose_name='ученик'),
+        ),
+        migrations.AlterField(
+            model_name='tasksolution',
+            name='task',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='students', to='tests_management.task', verbose_name='задание'),
+        ),
+        migrations.AddIndex(
+            model_name='tasksolution',
+            index=models.Index(fields=['task', 'student', 'result'], name='task_solution_task_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='tasksolution',
+            constraint=models.UniqueConstraint(fields=('student', 'task'), name='unique_task_solution'),
+        ),
+    ]
@@ -17,18 +17,22 @@ class OrderedTasksManager(models.Manager):
 
 class TaskSolution(models.Model):
     objects = OrderedTasksManager()
-    
+
+    # отдельные индексы по внешним ключам не нужны:
+    # их заменяют составные индексы из Meta
     student = models.ForeignKey(
         apps.core.models.Student,
         on_delete=models.CASCADE,
         related_name="tasks_solutions",
         verbose_name="ученик",
+        db_index=False,
     )
     task = models.ForeignKey(
         "tests_management.Task",
         on_delete=models.CASCADE,
         related_name="students",
         verbose_name="задание",
+        db_index=False,
     )
     result = models.SmallIntegerField(
         "результат в баллах",
@@ -40,27 +44,189 @@ class TaskSolution(models.Model):
     class Meta:
         verbose_name = "решение"
         verbose_name_plural = "решения"
+        constraints = [
+            # используется как цель upsert-записи (bulk_create с update_conflicts)
+            models.UniqueConstraint(
+                fields=["student", "task"],
+                name="unique_task_solution",
+            ),
+        ]
+        indexes = [
+            # покрывающий индекс для выборок по заданиям теста:
+            # баллы читаются без обращения к таблице
+            models.Index(
+                fields=["task", "student", "result"],
+                name="task_solution_task_idx",
+            ),
+        ]
+
+    @classmethod
+    def upsert_results(cls, solutions):
+        """
+        Записывает результаты одним запросом INSERT ... ON CONFLICT:
+        существующие решения (ученик, задание) обновляются, недостающие
+        создаются. Предварительно читать решения из базы не нужно
+        """
+        return cls.objects.bulk_create(
+            [
+                cls(
+                    student_id=solution.student_id,
+                    task_id=solution.task_id,
+                    result=solution.result,
+                )
+                for solution in solutions
+            ],
+            update_conflicts=True,
+            unique_fields=["student", "task"],
+            update_fields=["result"],
+        )
+
+
+class TestResultSummaryManager(models.Manager):
+    def refresh(self, test, student_ids=None):
+        """
+        Пересчитывает итоги теста test по TaskSolution
+        (для учеников student_ids или для всех учеников теста).
+        Итоги учеников, у которых не осталось решений, удаляются
+        """
+        solutions = TaskSolution.objects.filter(task__test=test)
+        summaries = self.filter(test=test)
+        if student_ids is not None:
+            solutions = solutions.filter(student_id__in=student_ids)
+            summaries = summaries.filter(student_id__in=student_ids)
+
+        rows = (
+            solutions
+            .order_by()
+            .values("student")
+            .annotate(
+                basic=models.Sum(
+                    "result", filter=models.Q(task__level=Task.BASIC)
+                ),
+                reflexive=models.Sum(
+                    "result", filter=models.Q(task__level=Task.REFLEXIVE)
+                ),
+                results_count=models.Count("result"),
+            )
+        )
+
+        def percent(points, level):
+            max_points = test.get_total_points(level)
+            if points is None or not max_points:
+                return None
+            return points / max_points * 100
+
+        objs = [
+            self.model(
+                test=test,
+                student_id=row["student"],
+                basic_points=row["basic"],
+                reflexive_points=row["reflexive"],
+                basic_percent=percent(row["basic"], Task.BASIC),
+                reflexive_percent=percent(row["reflexive"], Task.REFLEXIVE),
+                results_count=row["results_count"],
+                is_complete=row["results_count"] == test.tasks_count,
+            )
+            for row in rows
+        ]
+
+        summaries.exclude(student_id__in=[obj.student_id for obj in objs]).delete()
+        self.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=["test", "student"],
+            update_fields=[
+                "basic_points", "reflexive_points", "basic_percent",
+                "reflexive_percent", "results_count", "is_complete",
+            ],
+        )
+        return objs
+
+
+class TestResultSummary(models.Model):
+    """
+    Итог ученика за тест: баллы и проценты по уровням.
+    Денормализованная таблица для быстрого чтения, обновляется
+    при изменении решений и заданий теста (см. signals.py).
+    Полностью пересобирается командой rebuild_results_summaries
+    """
+    objects = TestResultSummaryManager()
+
+    test = models.ForeignKey(
+        Test,
+        on_delete=models.CASCADE,
+        related_name="results_summaries",
+        verbose_name="тест",
+    )
+    student = models.ForeignKey(
+        apps.core.models.Student,
+        on_delete=models.CASCADE,
+        related_name="tests_results_summaries",
+        verbose_name="ученик",
+    )
+    basic_points = models.IntegerField(
+        "баллы (базовый уровень)",
+        null=True,
+    )
+    reflexive_points = models.IntegerField(
+        "баллы (рефлексивный уровень)",
+        null=True,
+    )
+    basic_percent = models.FloatField(
+        "процент (базовый уровень)",
+        null=True,
+    )
+    reflexive_percent = models.FloatField(
+        "процент (рефлексивный уровень)",
+        null=True,
+    )
+    results_count = models.SmallIntegerField(
+        "количество заданий с выставленным баллом",
+        default=0,
+    )
+    is_complete = models.BooleanField(
+        "выставлены ли баллы за все задания",
+        default=False,
+    )
+
+    class Meta:
+        verbose_name = "итог теста"
+        verbose_name_plural = "итоги тестов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["test", "student"],
+                name="unique_test_result_summary",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["student", "test"]),
+        ]
+
+    @property
+    def empty_result(self):
+        return self.results_count == 0
 
 
 class ResultsCalculator:
     """
-    Предоставляет набор методов для расчета результатов теста
+    Предоставляет набор методов для расчета результатов теста.
+    Итоги многих учеников читайте из TestResultSummary
     """
     def __init__(self, test, student):
         self.test = test
         self.student = student
-    
+
     def get_solutions(self):
         return TaskSolution.objects.filter(
             task__test=self.test,
             student=self.student,
             result__isnull=False
         )
-        
+
     @property
     def empty_result(self):
-        return len(self.get_solutions()) == 0
-        
+        return not self.get_solutions().exists()
+
     def get_total_points(self, level):
         return (
             self.get_solutions()
@@ -70,28 +236,88 @@ class ResultsCalculator:
 
     def get_total_percent(self, level):
         return (
-            (self.get_total_points(level) /
+            ((self.get_total_points(level) or 0) /
             self.test.get_total_points(level)) * 100
         )
 
 
-class TasksStatistics:
+class GradebookMatrix:
     """
-    Предоставляет удобный интерфейс для доступа к данным
-    об успешности решения заданий
+    Таблица результатов класса за тест: строки - ученики, столбцы - задания.
+    Все решения загружаются одним запросом, итоги и статистика
+    по заданиям считаются в памяти
     """
-    def __init__(self, test):
+    def __init__(self, test, students):
         self.test = test
-        self.solutions = TaskSolution.objects.filter(task__test=self.test)
-        
-    def get_count(self, task, success=True):
-        filters = {"task": task}
-        
-        if success:
-            filters["result__gt"] = 0
-        else:
-            filters["result"] = 0
-            
-        return (
-            self.solutions.filter(**filters).aggregate(count=models.Count("*"))
-        )["count"]
+        self.students = list(students)
+        self.tasks = list(Task.objects.filter(test=test))
+        self.results = self._load_results()
+
+    def _load_results(self):
+        """
+        Возвращает матрицу баллов ученики x задания.
+        None - балл не выставлен (или у ученика нет решения задания)
+        """
+        rows = {student.id: i for i, student in enumerate(self.students)}
+        columns = {task.id: j for j, task in enumerate(self.tasks)}
+        results = [[None] * len(self.tasks) for _ in self.students]
+
+        solutions = (
+            TaskSolution.objects
+            .filter(task__test=self.test, student__in=self.students)
+            .order_by()
+            .values_list("student_id", "task_id", "result")
+        )
+        for student_id, task_id, result in solutions:
+            results[rows[student_id]][columns[task_id]] = result
+
+        return results
+
+    def _level_columns(self, level):
+        return [j for j, task in enumerate(self.tasks) if task.level == level]
+
+    def is_complete(self, row):
+        """
+        Выставлены ли ученику баллы за все задания теста
+        """
+        return all(result is not None for result in self.results[row])
+
+    def get_max_points(self, level):
+        return sum(task.max_points for task in self.tasks if task.level == level)
+
+    def get_total_points(self, row, level):
+        return sum(
+            self.results[row][j] or 0 for j in self._level_columns(level)
+        )
+
+    def get_total_percent(self, row, level):
+        max_points = self.get_max_points(level)
+        if not max_points:
+            return 0
+        return self.get_total_points(row, level) / max_points * 100
+
+    def get_count(self, column, success=True):
+        """
+        Количество учеников, которые справились (результат > 0)
+        или не справились (результат = 0) с заданием
+        """
+        return sum(
+            1 for row in self.results
+            if row[column] is not None and (row[column] > 0) == success
+        )
+
+    def divide_students(self):
+        """
+        Возвращает индексы строк учеников с полностью выставленными
+        баллами и учеников, у которых есть None в результатах теста
+        """
+        with_results = []
+        without_results = []
+
+        for row in range(len(self.students)):
+            if self.is_complete(row):
+                with_results.append(row)
+            else:
+                without_results.append(row)
+
+        return (with_results, without_results)
@@ -0,0 +1,134 @@
+from itertools import islice
+
+from django.db import transaction
+
+from apps.core.models import Student
+from apps.tests_app.models import TaskSolution, TestResultSummary
+from apps.tests_app.signals import solutions_changed
+from apps.tests_management.models import Task
+
+
+# количество строк, которое создается одним запросом
+ASSIGN_BATCH_SIZE = 500
+# количество строк, которое удаляется одной транзакцией
+DELETE_BATCH_SIZE = 500
+
+
+def _blank_solutions(tasks_by_test, students_ids):
+    for task_ids in tasks_by_test.values():
+        for student_id in students_ids:
+            for task_id in task_ids:
+                yield TaskSolution(student_id=student_id, task_id=task_id)
+
+
+def assign_tests(tests, groups, batch_size=ASSIGN_BATCH_SIZE):
+    """
+    Назначает тесты tests классам groups и создает пустые TaskSolution
+    для выставления будущих оценок. Ученики и задания читаются один раз,
+    решения создаются порциями по batch_size, уже существующие
+    решения не перезаписываются.
+    Возвращает количество созданных решений
+    """
+    tests = list(tests)
+    groups = list(groups)
+    if not tests or not groups:
+        return 0
+
+    tasks_by_test = {test.id: [] for test in tests}
+    for task_id, test_id in (
+        Task.objects.filter(test__in=tests)
+        .order_by()
+        .values_list("id", "test_id")
+    ):
+        tasks_by_test[test_id].append(task_id)
+
+    students_ids = list(
+        Student.objects.filter(group__in=groups).values_list("id", flat=True)
+    )
+    existing = TaskSolution.objects.filter(
+        task__test__in=tests, student__group__in=groups,
+    )
+
+    with transaction.atomic():
+        for test in tests:
+            test.groups.add(*groups)
+
+        count_before = existing.count()
+        solutions = _blank_solutions(tasks_by_test, students_ids)
+        while batch := list(islice(solutions, batch_size)):
+            TaskSolution.objects.bulk_create(
+                batch, batch_size=batch_size, ignore_conflicts=True
+            )
+        created = existing.count() - count_before
+
+        for test in tests:
+            solutions_changed.send(
+                sender=TaskSolution, test=test, student_ids=students_ids,
+            )
+
+    return created
+
+
+def _delete_in_batches(queryset, batch_size):
+    """
+    Удаляет строки queryset порциями по batch_size, каждую порцию
+    в отдельной короткой транзакции. У решений и итогов нет сигналов
+    удаления и зависимых строк, поэтому Django удаляет их одним
+    запросом на порцию, не загружая объекты в память.
+    Возвращает количество удаленных строк
+    """
+    model = queryset.model
+    pks_query = queryset.order_by().values_list("pk", flat=True)
+    deleted = 0
+    while pks := list(pks_query[:batch_size]):
+        with transaction.atomic(using=queryset.db):
+            _, counts = model.objects.filter(pk__in=pks).delete()
+            deleted += counts.get(model._meta.label, 0)
+    return deleted
+
+
+def delete_solutions(tests, groups=None, batch_size=DELETE_BATCH_SIZE):
+    """
+    Удаляет решения и итоги тестов tests, минуя Collector.
+    Если переданы groups, удаляются только решения учеников этих классов.
+    Возвращает количество удаленных решений
+    """
+    tests = list(tests)
+    tasks_ids = list(
+        Task.objects.filter(test__in=tests).values_list("id", flat=True)
+    )
+    solutions = TaskSolution.objects.filter(task_id__in=tasks_ids)
+    summaries = TestResultSummary.objects.filter(test__in=tests)
+
+    if groups is not None:
+        students_ids = list(
+            Student.objects.filter(group__in=groups).values_list("id", flat=True)
+        )
+        solutions = solutions.filter(student_id__in=students_ids)
+        summaries = summaries.filter(student_id__in=students_ids)
+    else:
+        # итог есть у каждого ученика, у которого есть решения
+        students_ids = list(
+            summaries.values_list("student_id", flat=True).distinct()
+        )
+
+    deleted = _delete_in_batches(solutions, batch_size)
+    _delete_in_batches(summaries, batch_size)
+
+    for test in tests:
+        solutions_changed.send(
+            sender=TaskSolution, test=test, student_ids=students_ids,
+        )
+    return deleted
+
+
+def delete_test(test, batch_size=DELETE_BATCH_SIZE):
+    """
+    Удаляет тест вместе с решениями. Решения удаляются порциями
+    до удаления самого теста, поэтому Collector их уже не загружает.
+    Задания удаляются каскадно, суммы теста при этом
+    не пересчитываются (см. refresh_test_totals)
+    """
+    delete_solutions([test], batch_size=batch_size)
+    with transaction.atomic():
+        test.delete()
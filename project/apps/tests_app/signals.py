@@ -0,0 +1,29 @@
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from apps.tests_app.models import TaskSolution, TestResultSummary
+from apps.tests_management.signals import test_totals_changed
+
+
+# Отправляется после массовой записи решений (bulk_create, bulk_update,
+# удаление по фильтру), для которой Django не отправляет post_save.
+# Аргументы: test - тест, student_ids - ученики, чьи решения изменились
+solutions_changed = Signal()
+
+
+@receiver(solutions_changed)
+def refresh_summaries_on_bulk_change(sender, test, student_ids, **kwargs):
+    TestResultSummary.objects.refresh(test, student_ids)
+
+
+@receiver(post_save, sender=TaskSolution)
+def refresh_summary_on_solution_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    TestResultSummary.objects.refresh(instance.task.test, [instance.student_id])
+
+
+@receiver(test_totals_changed)
+def refresh_summaries_on_totals_change(sender, test, **kwargs):
+    # изменение заданий меняет проценты и полноту всех итогов теста
+    TestResultSummary.objects.refresh(test)
@@ -0,0 +1,117 @@
+// Автосохранение ячеек таблицы оценок: изменения копятся и
+// отправляются одним PATCH-запросом после паузы во вводе
+const DEBOUNCE_MS = 800;
+
+const marksForm = document.querySelector("#marks-form");
+const autosaveUrl = marksForm.dataset.autosaveUrl;
+const csrfToken = marksForm.querySelector("[name=csrfmiddlewaretoken]").value;
+const statusLine = document.querySelector("#autosave-status");
+
+let pending = new Map();   // ячейки, ожидающие отправки
+let rejected = new Map();  // ячейки, отклоненные сервером
+let timer = null;
+let inFlight = false;
+
+function cellKey(input) {
+    return `${input.dataset.student}-${input.dataset.task}`;
+}
+
+marksForm.addEventListener("input", (e) => {
+    const input = e.target;
+    if (!input.dataset.task) return;
+
+    input.classList.remove("cell-saved", "cell-error");
+    // нецелый балл не отправляется: иначе он ушел бы
+    // на сервер вместе с правильными ячейками
+    if (input.value !== "" && !/^-?\d+$/.test(input.value.trim())) {
+        pending.delete(cellKey(input));
+        input.classList.remove("cell-unsaved");
+        input.classList.add("cell-error");
+        input.title = "Балл должен быть целым числом";
+        return;
+    }
+
+    pending.set(cellKey(input), input);
+    input.classList.add("cell-unsaved");
+
+    clearTimeout(timer);
+    timer = setTimeout(flush, DEBOUNCE_MS);
+});
+
+function collectInputs() {
+    // отклоненные ячейки ученика отправляются повторно вместе с новыми
+    // изменениями в его строке: ошибка могла быть исправлена в соседней ячейке
+    const students = new Set([...pending.values()].map(input => input.dataset.student));
+    rejected.forEach((input, key) => {
+        if (students.has(input.dataset.student) && !pending.has(key)) {
+            pending.set(key, input);
+        }
+    });
+
+    const inputs = [...pending.values()];
+    pending.clear();
+    return inputs;
+}
+
+async function flush() {
+    if (inFlight) {
+        timer = setTimeout(flush, DEBOUNCE_MS);
+        return;
+    }
+    if (pending.size === 0) return;
+
+    const inputs = collectInputs();
+    const changes = inputs.map(input => ({
+        student: Number(input.dataset.student),
+        task: Number(input.dataset.task),
+        result: input.value === "" ? null : Number(input.value.trim()),
+    }));
+
+    inFlight = true;
+    statusLine.textContent = "Сохранение...";
+    try {
+        const response = await fetch(autosaveUrl, {
+            method: "PATCH",
+            headers: {
+                "Content-Type": "application/json",
+                "X-CSRFToken": csrfToken,
+            },
+            body: JSON.stringify({changes: changes}),
+        });
+        if (response.status >= 400 && response.status < 500) {
+            // запрос отклонен целиком, повтор даст тот же ответ
+            const data = await response.json().catch(() => ({}));
+            inputs.forEach(input => markCell(input, data.error || "Не сохранено"));
+            statusLine.textContent = `Не сохранено: ${data.error || response.statusText}`;
+            return;
+        }
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error);
+
+        inputs.forEach(input => markCell(input, data.errors[input.dataset.student]));
+        const errorsCount = Object.keys(data.errors).length;
+        statusLine.textContent = errorsCount
+            ? `Не сохранено для учеников: ${errorsCount}`
+            : "Все изменения сохранены";
+    } catch (error) {
+        // изменения не потеряны: они будут отправлены при следующей попытке
+        inputs.forEach(input => pending.set(cellKey(input), input));
+        statusLine.textContent = "Ошибка сохранения, повторная попытка...";
+        timer = setTimeout(flush, DEBOUNCE_MS * 5);
+    } finally {
+        inFlight = false;
+    }
+}
+
+function markCell(input, error) {
+    input.classList.remove("cell-unsaved");
+    if (error) {
+        input.classList.add("cell-error");
+        input.title = error;
+        rejected.set(cellKey(input), input);
+    } else {
+        input.classList.add("cell-saved");
+        input.title = "";
+        rejected.delete(cellKey(input));
+    }
+}
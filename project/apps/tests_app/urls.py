@@ -17,4 +17,9 @@ urlpatterns = [
         views.SetMarksView.as_view(),
         name="set_marks",
     ),
+    path(
+        "<int:test_id>/groups/<int:group_id>/set_marks/cells/",
+        views.SaveMarksCellsView.as_view(),
+        name="save_marks_cells",
+    ),
 ]
@@ -1,16 +1,20 @@
 import datetime
+import json
 
 from django.contrib import messages
 import django.forms
+from django.db import transaction
 from django.views import generic
-from django.shortcuts import render, redirect
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render, redirect
 from django.db.models import Sum
 from django.urls import reverse_lazy
 
+from apps.core.db import retry_on_locked
 from apps.core.views import ListFiltersMixin
 import apps.core.models as core_models
 import apps.tests_app.forms as forms
-from apps.tests_app.models import ResultsCalculator, TaskSolution, TasksStatistics
+from apps.tests_app.models import GradebookMatrix, TaskSolution
 from apps.tests_management.models import TestAssign, Task, Test
 
 
@@ -26,85 +30,70 @@ class MarksView(generic.View):
     """
     Выводит таблицу с учениками и выставленными баллами за задания в тесте.
     Учеников, которые не писали тест, выводит отдельным списком.
-    Для удобного расчета итоговых столбцов 
+    Все данные берутся из GradebookMatrix, поэтому количество запросов
+    не зависит от размера класса
     """
-    def divide_students(self, students):
-        """
-        Во избежание ошибок отображения результатов в общей таблице,
-        разделяет учеников, у которых выставлены все баллы и
-        у которых есть None в результатах теста.
-        """
-        with_results = []
-        without_results = []
-        
-        for student in students:
-            task_solutions = (
-                TaskSolution
-                .objects.filter(student=student, task__test=self.test)
-            )
-            if all(task.result is not None for task in task_solutions):
-                with_results.append(student)
-            else:
-                without_results.append(student)
-        
-        return (with_results, without_results)
-    
-    def get_students_table_part(self, students):  
-        rows = []
-        for student in students:
-            calculator = ResultsCalculator(self.test, student)
+    def get_students_table_part(self, rows):
+        table_part = []
+        for i in rows:
+            student = self.matrix.students[i]
             row = {
                 "name": f"{student.surname} {student.name}",
-                "points": calculator.get_solutions(),
-                "basic_points": calculator.get_total_points(Task.BASIC),
-                "basic_percent": 
-                    round(calculator.get_total_percent(Task.BASIC)),
+                "points": self.matrix.results[i],
+                "basic_points": self.matrix.get_total_points(i, Task.BASIC),
+                "basic_percent":
+                    round(self.matrix.get_total_percent(i, Task.BASIC)),
             }
             if self.test.with_reflexive_level:
                 row.update({
-                    "reflexive_points": 
-                        calculator.get_total_points(Task.REFLEXIVE),
-                    "reflexive_percent": 
-                        round(calculator.get_total_percent(Task.REFLEXIVE)),
+                    "reflexive_points":
+                        self.matrix.get_total_points(i, Task.REFLEXIVE),
+                    "reflexive_percent":
+                        round(self.matrix.get_total_percent(i, Task.REFLEXIVE)),
                 })
-            
-            rows.append(row)
-        
-        return rows
-    
+
+            table_part.append(row)
+
+        return table_part
+
     def get_statistics_table_part(self):
-        tasks_statistics = TasksStatistics(self.test)
-        
+        columns = range(len(self.matrix.tasks))
+
         return {
-            "success": [tasks_statistics.get_count(task, success=True) for task in self.tasks],
-            "fail": [tasks_statistics.get_count(task, success=False) for task in self.tasks],
-        }   
-    
+            "success": [self.matrix.get_count(j, success=True) for j in columns],
+            "fail": [self.matrix.get_count(j, success=False) for j in columns],
+        }
+
     def get(self, request, test_id, group_id):
-        self.test = Test.objects.get(pk=test_id)
-        self.tasks = Task.objects.filter(test_id=test_id)
-        
+        self.test = Test.objects.select_related("subject").get(pk=test_id)
+
         if not self.test.is_published:
             return render(request, "tests_management/test_is_not_published.html", {})
-        
-        if len(self.tasks) == 0:
-            return render(request, "tests_app/no_results.html", {})
-        
-        students_with_result, students_without_results = self.divide_students(
-            core_models.Student.objects.filter(group_id=group_id)
-            .order_by("surname", "name")
+
+        group = core_models.Group.objects.select_related("campus").get(pk=group_id)
+        self.matrix = GradebookMatrix(
+            self.test,
+            core_models.Student.objects.filter(group=group)
+            .order_by("surname", "name"),
         )
-        
+
+        if len(self.matrix.tasks) == 0:
+            return render(request, "tests_app/no_results.html", {})
+
+        rows_with_results, rows_without_results = self.matrix.divide_students()
+
         return render(
             request,
             "tests_app/view_marks.html",
             {
                 "test": self.test,
-                "group": core_models.Group.objects.get(pk=group_id),
-                "tasks": self.tasks,
-                "students_with_result": students_with_result,
-                "students_without_results": students_without_results,
-                "students_table_part": self.get_students_table_part(students_with_result),
+                "group": group,
+                "tasks": self.matrix.tasks,
+                "students_without_results": [
+                    self.matrix.students[i] for i in rows_without_results
+                ],
+                "students_table_part":
+                    self.get_students_table_part(rows_with_results),
                 "statistic_table_part": self.get_statistics_table_part()
             }
         )
@@ -113,100 +102,97 @@ class MarksView(generic.View):
 class SetMarksView(generic.View):
     """
     View с таблицей для выставления оценок за 
-    определенную проверочную определенному классу
+    определенную проверочную определенному классу.
+    Все решения класса загружаются одним запросом и
+    сохраняются одной транзакцией
     """
     template_name = "tests_app/set_marks.html"
     
-    def get_task_solutions(self, student):
+    def get_task_solutions(self):
         """
-        Возвращает TaskSolutions ученика student,
+        Возвращает TaskSolutions всех учеников класса,
         связанные с этим тестом
         """
-        return(
+        return (
             TaskSolution.objects
             .filter(
-                student=student,
-                task__in=self.tasks,
+                student__in=self.students,
+                task__test=self.test_assign.test,
             )
+            .select_related("task", "student")
         )
     
-    def get_student_solutions_formsets(self):
+    def get_marks_form(self):
         """
-        Возвращает словарь вида ученик: 
-        формсет для выставления TaskSolution связанных с этим тестом.
+        Возвращает форму-таблицу для выставления результатов класса.
         Обновляет данными из request.POST, если они есть
         """
-        return {
-            student: forms.StudentTestSolutionFormSet(
-                self.request.POST if self.request.POST else None,
-                queryset=self.get_task_solutions(student),
-                prefix=f"student-id-{student.id}"
-            )
-            for student in self.students
-        }
+        return forms.MarksGridForm(
+            self.test_assign.test,
+            self.students,
+            self.tasks,
+            self.get_task_solutions(),
+            data=self.request.POST if self.request.POST else None,
+        )
     
     def dispatch(self, request, *args, **kwargs):
-        self.test_assign = TestAssign.objects.get(
-            test_id=kwargs["test_id"],
-            group_id=kwargs["group_id"]
+        self.test_assign = (
+            TestAssign.objects
+            .select_related("test__subject", "group__campus")
+            .get(test_id=kwargs["test_id"], group_id=kwargs["group_id"])
         )
         
         if not self.test_assign.test.is_published:
             return redirect(reverse_lazy("tests_management:test_is_not_published"))
         
-        self.students = (
+        self.students = list(
             core_models.Student.objects
             .filter(group=self.test_assign.group)
             .order_by("surname", "name")
         )
-        self.tasks = (
+        self.tasks = list(
             Task.objects
             .filter(test=self.test_assign.test)
         )
         
         return super().dispatch(request, *args, **kwargs)
     
-    def get(self, request, test_id, group_id):
+    def render_page(self, test_assign_form, marks_form):
         return render(
-            request,
+            self.request,
             self.template_name,
             {
                 "test": self.test_assign.test,
                 "group": self.test_assign.group,
                 "tasks": self.tasks,
-                "students": self.students,
-                "test_assign_form": forms.TestAssignForm(instance=self.test_assign),
-                "student_solutions_formsets":
-                    self.get_student_solutions_formsets(),
+                "test_assign_form": test_assign_form,
+                "marks_form": marks_form,
             },
         )
-        
-    def send_formset_errors_message(self, formset):
-        student = formset[0].instance.student
-        error_messages_str = (
-            ''.join(error.message for error in formset.non_form_errors().data)
-        )
-        messages.error(
-            self.request,
-            f"Ошибка при заполнении '{student.surname} {student.name}': "
-            f"{error_messages_str}"
+    
+    def get(self, request, test_id, group_id):
+        return self.render_page(
+            forms.TestAssignForm(instance=self.test_assign),
+            self.get_marks_form(),
         )
         
     def post(self, request, test_id, group_id):
         test_assign_form = forms.TestAssignForm(instance=self.test_assign, data=request.POST)
-        student_formsets = self.get_student_solutions_formsets()
+        marks_form = self.get_marks_form()
         
+        if not (test_assign_form.is_valid() and marks_form.is_valid()):
+            for error in marks_form.non_field_errors():
+                messages.error(request, error)
+            if any(marks_form.errors.get(name) for name in marks_form.fields):
+                messages.error(request, "Есть баллы вне допустимого диапазона")
+            return self.render_page(test_assign_form, marks_form)
         
-        if not test_assign_form.is_valid():
-            return self.get(request, test_id, group_id)
-        test_assign_form.save()
+        def save():
+            with transaction.atomic():
+                test_assign_form.save()
+                marks_form.save()
         
-        for student, formset in student_formsets.items():
-            if not formset.is_valid():
-                self.send_formset_errors_message(formset)
-                return self.get(request, test_id, group_id)
-            
-            formset.save()                
+        retry_on_locked(save)
                 
         return redirect(
             reverse_lazy(
@@ -214,3 +200,48 @@ class SetMarksView(generic.View):
                 kwargs={"test_id": test_id, "group_id": group_id},
             )
         )
+
+
+class SaveMarksCellsView(generic.View):
+    """
+    Автосохранение ячеек таблицы выставления оценок.
+    Принимает PATCH с JSON вида
+    {"changes": [{"student": id, "task": id, "result": число или null}]}
+    и возвращает сохраненные ячейки и ошибки по ученикам
+    """
+    http_method_names = ["patch"]
+
+    def patch(self, request, test_id, group_id):
+        test_assign = get_object_or_404(
+            TestAssign.objects.select_related("test", "group"),
+            test_id=test_id,
+            group_id=group_id,
+        )
+        if not test_assign.test.is_published:
+            return JsonResponse({"error": "Тест не опубликован"}, status=403)
+
+        try:
+            # ValueError включает и JSONDecodeError, и UnicodeDecodeError
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "Некорректный JSON"}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "Ожидается JSON-объект"}, status=400)
+
+        try:
+            update = forms.MarksCellsUpdate(
+                test_assign.test, test_assign.group, data.get("changes"),
+            )
+        except ValueError as error:
+            return JsonResponse({"error": str(error)}, status=400)
+
+        update.is_valid()
+        retry_on_locked(update.save)
+
+        return JsonResponse({
+            "saved": [
+                {"student": student_id, "task": task_id}
+                for student_id, task_id in update.valid_changes
+            ],
+            "errors": update.errors,
+        })
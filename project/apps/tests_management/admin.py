@@ -1,8 +1,18 @@
 from django.contrib import admin
 
 import apps.tests_management.models
+from apps.tests_app.services import delete_test
+
+
+@admin.register(apps.tests_management.models.Test)
+class TestAdmin(admin.ModelAdmin):
+    def delete_model(self, request, obj):
+        delete_test(obj)
+
+    def delete_queryset(self, request, queryset):
+        for test in queryset:
+            delete_test(test)
 
 
 admin.site.register(apps.tests_management.models.Task)
-admin.site.register(apps.tests_management.models.Test)
 admin.site.register(apps.tests_management.models.TestAssign)
@@ -5,3 +5,6 @@ class TestsManagementConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.tests_management"
     verbose_name = "Управление проверочными"
+
+    def ready(self):
+        import apps.tests_management.signals  # noqa: F401
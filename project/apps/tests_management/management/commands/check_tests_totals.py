@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from apps.tests_management.models import Test
+from apps.tests_management.signals import test_totals_changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет сохраненные в Test суммы баллов и количество заданий "
+        "с заданиями теста"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="исправить расхождения",
+        )
+
+    def handle(self, *args, fix=False, **options):
+        mismatches = 0
+        for test in Test.objects.iterator():
+            totals = test.calculate_totals()
+            stored = {field: getattr(test, field) for field in totals}
+            if stored == totals:
+                continue
+
+            mismatches += 1
+            self.stdout.write(f"{test.pk} {test}: сохранено {stored}, по заданиям {totals}")
+            if fix:
+                test.refresh_totals()
+                test_totals_changed.send(sender=Test, test=test)
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Расхождений нет"))
+        elif fix:
+            self.stdout.write(self.style.SUCCESS(f"Исправлено тестов: {mismatches}"))
+        else:
+            self.stdout.write(self.style.WARNING(f"Тестов с расхождениями: {mismatches}"))
@@ -0,0 +1,56 @@
+# Generated by Django 4.2 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+
+def fill_totals(apps, schema_editor):
+    Test = apps.get_model("tests_management", "Test")
+    Task = apps.get_model("tests_management", "Task")
+
+    totals = {}
+    rows = (
+        Task.objects
+        .order_by()
+        .values("test", "level")
+        .annotate(sum_max_points=models.Sum("max_points"), count=models.Count("id"))
+    )
+    for row in rows:
+        prefix = "basic" if row["level"] == "Баз" else "reflexive"
+        totals.setdefault(row["test"], {}).update({
+            f"{prefix}_max_points": row["sum_max_points"],
+            f"{prefix}_tasks_count": row["count"],
+        })
+
+    for test_id, test_totals in totals.items():
+        Test.objects.filter(pk=test_id).update(**test_totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests_management', '0014_alter_task_level_alter_task_max_points_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='basic_max_points',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='максимум баллов (базовый уровень)'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='basic_tasks_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='количество заданий (базовый уровень)'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='reflexive_max_points',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='максимум баллов (рефлексивный уровень)'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='reflexive_tasks_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='количество заданий (рефлексивный уровень)'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
@@ -54,6 +54,28 @@ class Test(models.Model):
         related_name="tests",
         blank=True,
     )
+    # суммы максимальных баллов и количество заданий по уровням.
+    # Пересчитываются refresh_totals при изменении заданий (см. signals.py)
+    basic_max_points = models.PositiveIntegerField(
+        "максимум баллов (базовый уровень)",
+        default=0,
+        editable=False,
+    )
+    reflexive_max_points = models.PositiveIntegerField(
+        "максимум баллов (рефлексивный уровень)",
+        default=0,
+        editable=False,
+    )
+    basic_tasks_count = models.PositiveSmallIntegerField(
+        "количество заданий (базовый уровень)",
+        default=0,
+        editable=False,
+    )
+    reflexive_tasks_count = models.PositiveSmallIntegerField(
+        "количество заданий (рефлексивный уровень)",
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "проверочная"
@@ -62,9 +84,55 @@ class Test(models.Model):
     def __str__(self):
         return f"{self.name} {self.studing_year} класс"
         
+    def calculate_totals(self):
+        """
+        Возвращает суммы максимальных баллов и количество заданий
+        по уровням, посчитанные по заданиям теста одним запросом
+        """
+        totals = {
+            "basic_max_points": 0,
+            "reflexive_max_points": 0,
+            "basic_tasks_count": 0,
+            "reflexive_tasks_count": 0,
+        }
+        rows = (
+            Task.objects
+            .filter(test=self)
+            .order_by()
+            .values("level")
+            .annotate(
+                sum_max_points=models.Sum("max_points"),
+                count=models.Count("id"),
+            )
+        )
+        for row in rows:
+            prefix = "basic" if row["level"] == Task.BASIC else "reflexive"
+            totals[f"{prefix}_max_points"] = row["sum_max_points"]
+            totals[f"{prefix}_tasks_count"] = row["count"]
+        return totals
+
+    def refresh_totals(self):
+        """
+        Пересчитывает сохраненные суммы баллов и количество заданий.
+        Возвращает True, если значения изменились
+        """
+        totals = self.calculate_totals()
+        changed = any(
+            getattr(self, field) != value for field, value in totals.items()
+        )
+        Test.objects.filter(pk=self.pk).update(**totals)
+        for field, value in totals.items():
+            setattr(self, field, value)
+        return changed
+
+    @property
+    def tasks_count(self):
+        return self.basic_tasks_count + self.reflexive_tasks_count
+
     def get_total_points(self, level):
-        tasks = self.tasks.filter(level=level)
-        return tasks.aggregate(sum_max_points=models.Sum("max_points"))["sum_max_points"]
+        if level == Task.BASIC:
+            return self.basic_max_points
+        return self.reflexive_max_points
     
     @property
     def total_basic_points(self):
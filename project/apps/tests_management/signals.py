@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from apps.tests_management.models import Task, Test
+
+
+# Отправляется после изменения сумм максимальных баллов
+# или количества заданий теста. Аргументы: test - тест
+test_totals_changed = Signal()
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def refresh_test_totals(sender, instance, raw=False, origin=None, **kwargs):
+    if raw:
+        return
+    # задания удаляются вместе с тестом: пересчитывать его суммы незачем
+    if isinstance(origin, Test) or getattr(origin, "model", None) is Test:
+        return
+    test = instance.test
+    if test.refresh_totals():
+        test_totals_changed.send(sender=test.__class__, test=test)
@@ -1,13 +1,12 @@
 import random
 
-from django.db import transaction
 from django.contrib import messages
 from django.views import generic
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 
 from apps.core.views import ListFiltersMixin
-from apps.tests_app.models import TaskSolution
+from apps.tests_app.services import assign_tests, delete_solutions, delete_test
 from apps.tests_management import forms
 from apps.tests_management import models
 
@@ -104,6 +103,11 @@ class TestDeleteView(generic.DeleteView):
     model = models.Test
     template_name = "tests_management/test_confirm_delete.html"
     success_url = reverse_lazy("tests_management:tests_list")
+    
+    def form_valid(self, form):
+        success_url = self.get_success_url()
+        delete_test(self.object)
+        return redirect(success_url)
 
 
 # операции с отдельным заданием
@@ -174,19 +178,8 @@ class AddGroupsView(GroupsView):
         """
         
         self.test = self.get_object()
-        
-        with transaction.atomic():
-            self.test.groups.add(*groups_list)
-            
-            blank_task_solutions = []
-            for group in groups_list:
-                for student in group.students.all():
-                    for task in self.test.tasks.all():
-                        blank_task_solutions.append(
-                            TaskSolution(student=student, task=task)
-                        )
-                        
-            TaskSolution.objects.bulk_create(blank_task_solutions)
+        created = assign_tests([self.test], groups_list)
+        self.success_message = f"{self.success_message}. Создано решений: {created}"
 
 
 class RemoveGroupsView(GroupsView):
@@ -203,11 +196,8 @@ class RemoveGroupsView(GroupsView):
         
         self.test = self.get_object()
         
-        with transaction.atomic():
-            self.test.groups.remove(*groups_list)
-            
-            if groups_list:
-                TaskSolution.objects.filter(
-                    student__group__in=groups_list,
-                    task__test__id=self.test.id,
-                ).delete()
+        if groups_list:
+            # решения удаляются до отмены назначения: если удаление
+            # прервется, его можно повторить той же формой
+            delete_solutions([self.test], groups_list)
+        self.test.groups.remove(*groups_list)
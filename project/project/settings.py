@@ -121,4 +121,38 @@ STATICFILES_DIRS = [
     BASE_DIR / "static_dev/",
 ]
 
+MEDIA_URL = "media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
+# фрагменты личных карточек хранятся в файловом кэше,
+# общем для всех процессов сервера
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "template_fragments": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("DJANGO_CACHE_DIR", BASE_DIR / "cache"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# верстка pdf личных карточек: количество процессов
+# и время ожидания одной карточки в секундах
+PERSONAL_CARDS_PDF_WORKERS = int(
+    os.getenv("PERSONAL_CARDS_PDF_WORKERS", os.cpu_count() or 1)
+)
+PERSONAL_CARDS_PDF_TIMEOUT = int(os.getenv("PERSONAL_CARDS_PDF_TIMEOUT", 60))
+# профиль вывода pdf: compact (статические начертания шрифтов,
+# оптимизация изображений) или default
+PERSONAL_CARDS_PDF_PROFILE = os.getenv("PERSONAL_CARDS_PDF_PROFILE", "compact")
+# сколько последних оценок каждого межпредметного навыка показывается в карточке
+PERSONAL_CARDS_SOFTSKILLS_MARKS_COUNT = int(
+    os.getenv("PERSONAL_CARDS_SOFTSKILLS_MARKS_COUNT", 3)
+)
+# время хранения фрагментов карточки в кэше в секундах
+PERSONAL_CARDS_FRAGMENTS_TIMEOUT = int(
+    os.getenv("PERSONAL_CARDS_FRAGMENTS_TIMEOUT", 7 * 24 * 60 * 60)
+)
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"